@@ -0,0 +1,91 @@
+import re
+from langchain_core.messages import AIMessage, HumanMessage
+
+FILENAME_LINE = re.compile(r"^[ \t]*//[ \t]*Filename:[ \t]*(\S+)[ \t]*$", re.MULTILINE)
+CODE_BLOCK = re.compile(r"\s*```[^\n]*\n.*?```", re.DOTALL)
+
+# File kinds every generated journey needs, matched against the `// Filename:` paths
+JOURNEY_FILE_KINDS = {
+    "journey constructor (backend/src/workflows/write/<featureName>/<featureName>.ts)":
+        re.compile(r"workflows/write/([^/]+)/\1\.ts$"),
+    "actor steps (actorSteps/)": re.compile(r"/(actorSteps|actionSteps)/[^/]+\.ts$"),
+    "automated steps (automatedSteps/)": re.compile(r"/automatedSteps/[^/]+\.ts$"),
+    "activities (backend/src/activities/)": re.compile(r"(^|/)activities/.+\.ts$"),
+    "React components (frontend .tsx)": re.compile(r"\.tsx$"),
+}
+
+MISSING_FILES_PROMPT = (
+    "Your answer is missing part of the journey. Generate ONLY these missing parts: {missing}.\n"
+    "These files already exist, do not repeat them: {existing}.\n"
+    "Use the same feature name, import paths and output format as before."
+)
+
+def parse_file_sections(text):
+    """
+    Split an answer into its `// Filename:` sections.
+    Returns [(filename, start, end)] where text[start:end] is the filename line plus its code block.
+    """
+    sections = []
+    for match in FILENAME_LINE.finditer(text):
+        end = match.end()
+        block = CODE_BLOCK.match(text, end)
+        if block:
+            end = block.end()
+        sections.append((match.group(1), match.start(), end))
+    return sections
+
+def missing_file_kinds(filenames, kinds=JOURNEY_FILE_KINDS):
+    return [kind for kind, pattern in kinds.items() if not any(pattern.search(name) for name in filenames)]
+
+def merge_file_sections(answer, delta, existing):
+    """
+    Insert the delta's file sections that are not already in the answer after the answer's last file.
+    Returns (merged answer, added filenames).
+    """
+    added = []
+    new_sections = []
+    for filename, start, end in parse_file_sections(delta):
+        if filename not in existing and filename not in added:
+            added.append(filename)
+            new_sections.append(delta[start:end])
+    if not new_sections:
+        return answer, added
+    sections = parse_file_sections(answer)
+    position = sections[-1][2] if sections else len(answer)
+    insert = "\n\n" + "\n\n".join(new_sections)
+    return answer[:position] + insert + answer[position:], added
+
+class CompletenessValidator:
+    """
+    Check a generated answer against the expected journey shape and fill in only what is missing.
+
+    The answer's `// Filename:` sections are matched against `kinds`; if some kinds have no file,
+    one follow-up call asks for just those files and the new sections are merged into the answer.
+    """
+    def __init__(self, llm, kinds=JOURNEY_FILE_KINDS):
+        self.llm = llm
+        self.kinds = kinds
+
+    def complete(self, prompt_messages, answer, known_files=()):
+        """
+        Returns (answer, report) where report lists the missing kinds and the files that were added.
+        `known_files` are files generated earlier (e.g. in a previous session turn) that count as present.
+        """
+        filenames = [filename for filename, _, _ in parse_file_sections(answer)]
+        filenames += [filename for filename in known_files if filename not in filenames]
+        missing = missing_file_kinds(filenames, self.kinds)
+        report = {"files": len(filenames), "missing": missing, "added": []}
+        if not missing:
+            return answer, report
+
+        print(f"Answer has {len(filenames)} files, requesting missing: {missing}")
+        followup = HumanMessage(content=MISSING_FILES_PROMPT.format(
+            missing="; ".join(missing),
+            existing=", ".join(filenames) or "none",
+        ))
+        response = self.llm.invoke(list(prompt_messages) + [AIMessage(content=answer), followup])
+        delta = response.content
+        if isinstance(delta, list):
+            delta = '\n'.join(str(item) for item in delta)
+        answer, report["added"] = merge_file_sections(answer, delta, set(filenames))
+        return answer, report
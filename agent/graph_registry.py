@@ -0,0 +1,108 @@
+import os
+import threading
+from agent.workflow import GraphBuilder
+from toolkit import tools
+from utils.config_loader import load_config
+from utils.model_loaders import reset_shared_models
+from utils.rate_limiter import reset_rate_limiters
+
+CONFIG_PATH = "config/config.yaml"
+
+class GraphRegistry:
+    """
+    Process-wide registry of compiled graphs, one per LLM provider, built with the
+    topology selected by `graph.topology` in config.yaml.
+
+    Graphs are built once (usually at app startup) and reused for every request.
+    If config.yaml changes on disk, the graphs are rebuilt on next access, after the process-wide
+    objects built from the config are reset: the LLM router, rate limiters, embedding model,
+    reranker, retrieval cache and retriever settings. Server settings read at startup in main.py
+    (uploads, response cache, sessions, ingestion workers) still need a restart.
+    """
+    def __init__(self, config_path=CONFIG_PATH):
+        self.config_path = config_path
+        self._graphs = {}
+        # provider -> copy of the compiled graph bound to the session checkpointer
+        self._session_graphs = {}
+        self._config_mtime = self._read_config_mtime()
+        self._lock = threading.Lock()
+
+    def _read_config_mtime(self):
+        try:
+            return os.path.getmtime(self.config_path)
+        except OSError:
+            return None
+
+    def _apply_config(self):
+        # Reset what the graphs' nodes and tools share, so the rebuilt graphs see the new settings
+        config = load_config(self.config_path)
+        reset_shared_models(config)
+        reset_rate_limiters()
+        tools.reload_config(config)
+
+    def _build(self, provider):
+        # "sequential": one chatbot completion per answer; "fanout": plan, then generate files in parallel
+        topology = load_config(self.config_path).get("graph", {}).get("topology", "sequential")
+        print(f"Building {topology} graph for {provider} provider...")
+        graph_service = GraphBuilder(provider=provider)
+        if topology == "fanout":
+            graph_service.build_fanout()
+        elif topology == "sequential":
+            graph_service.build()
+        else:
+            raise ValueError(f"Unsupported graph topology: {topology}")
+        return graph_service.get_graph()
+
+    def warm(self, providers=("google",)):
+        """
+        Build and compile the graphs for the given providers ahead of the first request.
+        """
+        for provider in providers:
+            self.get(provider)
+
+    def get(self, provider="google", checkpointer=None):
+        """
+        Return the compiled graph for the provider, building it on first use
+        or after a config change. With a checkpointer, return the graph bound to it
+        (for session runs with a thread_id).
+        """
+        mtime = self._read_config_mtime()
+        graph = self._graphs.get(provider)
+        if graph is None or mtime != self._config_mtime:
+            with self._lock:
+                if mtime != self._config_mtime:
+                    print("Config changed, dropping compiled graphs")
+                    self._graphs.clear()
+                    self._session_graphs.clear()
+                    self._config_mtime = mtime
+                    self._apply_config()
+                graph = self._graphs.get(provider)
+                if graph is None:
+                    graph = self._build(provider)
+                    self._graphs[provider] = graph
+        if checkpointer is None:
+            return graph
+
+        session_graph = self._session_graphs.get(provider)
+        if session_graph is None or session_graph.checkpointer is not checkpointer:
+            # Same compiled nodes, only the checkpointer differs
+            session_graph = graph.copy(update={"checkpointer": checkpointer})
+            self._session_graphs[provider] = session_graph
+        return session_graph
+
+    def rebuild(self, provider=None):
+        """
+        Rebuild the graph for one provider, or every registered provider if none is given.
+        """
+        with self._lock:
+            providers = [provider] if provider else list(self._graphs) or ["google"]
+            mtime = self._read_config_mtime()
+            if mtime != self._config_mtime:
+                self._config_mtime = mtime
+                self._apply_config()
+            for name in providers:
+                self._graphs[name] = self._build(name)
+                self._session_graphs.pop(name, None)
+            return providers
+
+graph_registry = GraphRegistry()
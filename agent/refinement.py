@@ -0,0 +1,106 @@
+import re
+from utils.lexical_index import tokenize
+
+JOURNEY_NOUNS = {"journey", "journeys", "workflow", "workflows"}
+# "a journey", "another workflow": a journey other than the one in the session
+NEW_DETERMINERS = {"a", "an", "another", "new", "different", "separate", "second", "other"}
+SAME_DETERMINERS = {"the", "this", "that", "these", "those", "our", "your", "its", "my", "same", "current", "existing"}
+# Words that end a journey's description when reading backwards from the noun
+BOUNDARY_WORDS = {
+    "for", "to", "of", "with", "in", "on", "and", "or", "like", "as", "using", "from", "into", "by", "me", "us",
+    "is", "are", "was", "does", "do", "what", "how", "which", "why", "all", "any", "every", "each",
+}
+# "journey step", "workflow file": parts of a journey, not a journey
+PART_WORDS = {
+    "step", "steps", "file", "files", "constructor", "config", "configuration", "component", "components",
+    "definition", "name", "test", "tests", "code", "activity", "activities", "state", "data",
+}
+FILLER_WORDS = {"whole", "entire", "full", "complete", "user", "end", "same"}
+MAX_DESCRIPTION_WORDS = 5
+
+# "rename the step", "now add validation", "can you also remove ...": an edit of what was generated
+EDIT_REQUEST = re.compile(
+    r"^\W*((now|also|then|and|but|instead|ok(ay)?|please|can you|could you)\W+)*"
+    r"(change|update|rename|modify|fix|adjust|tweak|refactor|replace|remove|delete|drop|add|extend|"
+    r"make|use|move|split|merge|convert|improve|include|rewrite|regenerate|redo)\b",
+    re.IGNORECASE,
+)
+REFERS_TO_ANSWER = re.compile(
+    r"\b(the|this|that|these|those|your|its)\s+(code|files?|components?|steps?|activit(y|ies)|answer|output)\b"
+    r"|\b(above|previous(ly)?|earlier|last answer)\b",
+    re.IGNORECASE,
+)
+WORD = re.compile(r"[A-Za-z0-9_$]+")
+FILE_NAME = re.compile(r"[^/]+?(?=\.\w+$)")
+GENERIC_PATH_PARTS = {
+    "backend", "frontend", "src", "workflows", "write", "activities", "actorSteps", "actionSteps",
+    "automatedSteps", "components", "index",
+}
+
+def _generated_names(journey_files):
+    """
+    File and folder names of the session's generated files (feature names among them).
+    """
+    names = set()
+    for filename in journey_files:
+        parts = filename.split("/")
+        match = FILE_NAME.match(parts[-1])
+        names.update(part for part in [match.group() if match else parts[-1]] + parts[:-1] if len(part) >= 4)
+    return names - GENERIC_PATH_PARTS
+
+def _session_vocabulary(journey_files):
+    return {token for name in _generated_names(journey_files) for token in tokenize(name)}
+
+def journey_mentions(question):
+    """
+    Return [(determiner or None, description words)] for each journey/workflow noun phrase,
+    e.g. "create the legal name change journey" -> [("the", ["legal", "name", "change"])].
+    """
+    words = [word.lower() for word in WORD.findall(question)]
+    mentions = []
+    for position, word in enumerate(words):
+        if word not in JOURNEY_NOUNS:
+            continue
+        if position + 1 < len(words) and words[position + 1] in PART_WORDS:
+            continue
+        determiner = None
+        description = []
+        for previous in reversed(words[max(0, position - MAX_DESCRIPTION_WORDS - 1):position]):
+            if previous in NEW_DETERMINERS or previous in SAME_DETERMINERS:
+                determiner = previous
+                break
+            if previous in BOUNDARY_WORDS:
+                break
+            description.insert(0, previous)
+        mentions.append((determiner, [word for word in description if word not in FILLER_WORDS]))
+    return mentions
+
+def _asks_for_other_journey(question, journey_files):
+    """
+    Whether the question names a journey other than the session's: one described in words the
+    session's file and feature names don't contain, or an undescribed "a/another/new journey".
+    """
+    vocabulary = _session_vocabulary(journey_files)
+    for determiner, description in journey_mentions(question):
+        if description:
+            # "the ownership change journey" vs "the legal name change journey"
+            if not all(token in vocabulary for word in description for token in tokenize(word)):
+                return True
+        elif determiner in NEW_DETERMINERS:
+            return True
+    return False
+
+def is_refinement(question, journey_files):
+    """
+    Whether a session turn edits the journey generated earlier in the session rather than asking
+    for a different one. Refinements reuse the journey's context and files; anything else is
+    treated as a new question and retrieves its own context.
+    """
+    if not journey_files or not question or _asks_for_other_journey(question, journey_files):
+        return False
+    if EDIT_REQUEST.search(question) or REFERS_TO_ANSWER.search(question):
+        return True
+    if any(determiner in SAME_DETERMINERS for determiner, _ in journey_mentions(question)):
+        return True
+    lowered = question.lower()
+    return any(name.lower() in lowered for name in _generated_names(journey_files))
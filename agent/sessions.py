@@ -0,0 +1,149 @@
+import asyncio
+import os
+import sqlite3
+import time
+from langchain_core.messages import HumanMessage, RemoveMessage
+from langgraph.checkpoint.sqlite import SqliteSaver
+from prompt_library.prompt import SUMMARY_PROMPT
+
+class SessionCheckpointer(SqliteSaver):
+    """
+    SQLite checkpointer for conversation sessions, usable from both `invoke` and `astream_events`.
+
+    SqliteSaver only implements the sync API; the async methods run it in a worker thread
+    so one store serves /query and /query/stream.
+
+    SqliteSaver keeps every super-step's full state forever. `end_turn` keeps only a thread's
+    latest checkpoint, which is all a session resumes from, and threads idle for longer than
+    `idle_ttl_seconds` are deleted (checked at most every `expire_interval_seconds`).
+    """
+    def __init__(self, conn, idle_ttl_seconds=72 * 3600, expire_interval_seconds=600, **kwargs):
+        super().__init__(conn, **kwargs)
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self.expire_interval_seconds = expire_interval_seconds
+        self._last_expiry = 0.0
+
+    def setup(self):
+        if self.is_setup:
+            return
+        super().setup()
+        with self.lock:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS session_activity (thread_id TEXT PRIMARY KEY, updated_at REAL NOT NULL)"
+            )
+            self.conn.commit()
+
+    def end_turn(self, thread_id):
+        """
+        After a run: drop the thread's older checkpoints, record its activity and expire idle threads.
+        """
+        latest = "SELECT checkpoint_ns, MAX(checkpoint_id) FROM checkpoints WHERE thread_id = ? GROUP BY checkpoint_ns"
+        with self.cursor() as cursor:
+            for table in ("writes", "checkpoints"):
+                cursor.execute(
+                    f"DELETE FROM {table} WHERE thread_id = ? AND (checkpoint_ns, checkpoint_id) NOT IN ({latest})",
+                    (thread_id, thread_id),
+                )
+            cursor.execute(
+                "INSERT OR REPLACE INTO session_activity (thread_id, updated_at) VALUES (?, ?)",
+                (thread_id, time.time()),
+            )
+        if time.monotonic() - self._last_expiry >= self.expire_interval_seconds:
+            self._last_expiry = time.monotonic()
+            self.expire_idle()
+
+    def expire_idle(self):
+        """
+        Delete every thread without activity for `idle_ttl_seconds`. Returns how many were deleted.
+        """
+        with self.cursor() as cursor:
+            cursor.execute(
+                "SELECT thread_id FROM session_activity WHERE updated_at < ?", (time.time() - self.idle_ttl_seconds,)
+            )
+            thread_ids = [row[0] for row in cursor.fetchall()]
+            for thread_id in thread_ids:
+                for table in ("writes", "checkpoints", "session_activity"):
+                    cursor.execute(f"DELETE FROM {table} WHERE thread_id = ?", (thread_id,))
+        if thread_ids:
+            print(f"Expired {len(thread_ids)} idle sessions")
+        return len(thread_ids)
+
+    def delete_thread(self, thread_id):
+        super().delete_thread(thread_id)
+        with self.cursor() as cursor:
+            cursor.execute("DELETE FROM session_activity WHERE thread_id = ?", (thread_id,))
+    async def aget_tuple(self, config):
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        items = await asyncio.to_thread(lambda: list(self.list(config, filter=filter, before=before, limit=limit)))
+        for item in items:
+            yield item
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        return await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def aend_turn(self, thread_id):
+        return await asyncio.to_thread(self.end_turn, thread_id)
+
+    async def adelete_thread(self, thread_id):
+        return await asyncio.to_thread(self.delete_thread, thread_id)
+
+def create_checkpointer(path="sessions/checkpoints.sqlite", idle_ttl_seconds=72 * 3600, expire_interval_seconds=600):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    checkpointer = SessionCheckpointer(
+        sqlite3.connect(path, check_same_thread=False),
+        idle_ttl_seconds=idle_ttl_seconds,
+        expire_interval_seconds=expire_interval_seconds,
+    )
+    checkpointer.setup()
+    return checkpointer
+
+def _transcript(messages, max_chars_per_message=2000):
+    lines = []
+    for message in messages:
+        content = message.content if isinstance(message.content, str) else str(message.content)
+        if len(content) > max_chars_per_message:
+            content = content[:max_chars_per_message] + " [...]"
+        lines.append(f"{message.type}: {content}")
+    return "\n\n".join(lines)
+
+class SessionMemory:
+    """
+    Keeps a session's message history bounded.
+
+    Once a conversation has more than `max_messages` messages, everything before the last
+    `keep_messages` (cut at a user message, so tool calls stay with their results) is folded
+    into a running summary by the LLM and removed from state.
+    """
+    def __init__(self, llm, max_messages=12, keep_messages=6):
+        self.llm = llm
+        self.max_messages = max_messages
+        self.keep_messages = keep_messages
+
+    def _cut_index(self, messages):
+        cut = len(messages) - self.keep_messages
+        while 0 < cut < len(messages) and not isinstance(messages[cut], HumanMessage):
+            cut += 1
+        return cut if 0 < cut < len(messages) else 0
+
+    def node(self, state):
+        messages = state["messages"]
+        if len(messages) <= self.max_messages:
+            return {}
+        cut = self._cut_index(messages)
+        if not cut:
+            return {}
+        older = messages[:cut]
+        response = self.llm.invoke([HumanMessage(content=SUMMARY_PROMPT.format(
+            summary=state.get("summary") or "(none)",
+            transcript=_transcript(older),
+        ))])
+        summary = response.content if isinstance(response.content, str) else str(response.content)
+        print(f"Summarized {len(older)} older session messages")
+        return {"summary": summary, "messages": [RemoveMessage(id=message.id) for message in older]}
@@ -1,13 +1,145 @@
-from langgraph.graph import StateGraph, START
+import json
+import re
+import threading
+from langgraph.graph import StateGraph, START, END
 from langgraph.graph.message import add_messages
 from langgraph.prebuilt.tool_node import ToolNode, tools_condition
+from langgraph.types import Send
 from langchain_core.messages import AIMessage, HumanMessage
 from typing_extensions import Annotated, TypedDict
 from utils.model_loaders import ModelLoader
+from utils.config_loader import load_config
+from utils.context_packer import ContextPacker
+from utils.progress_events import emit_progress
+from prompt_library.prompt import build_prompt_messages, PLANNER_PROMPT, FILE_PROMPT
+from agent.completeness import CompletenessValidator, parse_file_sections
+from agent.refinement import is_refinement
+from agent.sessions import SessionMemory
 from toolkit.tools import *
 
+# Retrieval results kept in state; sessions carry them across turns
+MAX_RETRIEVALS = 8
+
+def merge_retrievals(left, right):
+    merged = {**(left or {}), **(right or {})}
+    return dict(list(merged.items())[-MAX_RETRIEVALS:])
+
+def merge_files(left, right):
+    # The planner writes None to start each plan with an empty list; sessions checkpoint
+    # this field, so entries from an earlier turn's plan would otherwise be merged again
+    if right is None:
+        return []
+    return (left or []) + right
+
 class State(TypedDict):
     messages: Annotated[list, add_messages]
+    # Retrieved documents keyed by retrieval_key(question), shared by the chatbot node and the tool
+    retrievals: Annotated[dict, merge_retrievals]
+    # Question whose retrieval is the conversation's context, reused by follow-up turns
+    context_question: str
+    # Running summary of session messages trimmed from `messages`
+    summary: str
+    # Filename -> `// Filename:` section of the latest version of every file generated in the session
+    journey_files: dict
+    # Whether this turn edits the session's journey (set once per turn by the memory node)
+    refinement: bool
+    # Planned files whose generation failed this turn; such an answer is incomplete and never cached
+    failed_files: list
+
+class FanoutState(State):
+    question: str
+    rag_context: str
+    # [{"filename", "spec"}] from the planner
+    plan: list
+    # Generated sections from the parallel per-file nodes, merged in plan order
+    files: Annotated[list, merge_files]
+
+class FileTask(TypedDict):
+    messages: list
+    rag_context: str
+    plan: list
+    index: int
+
+JSON_ARRAY = re.compile(r"\[.*\]", re.DOTALL)
+FILE_CODE_BLOCK = re.compile(r"```([^\n]*)\n(.*?)```", re.DOTALL)
+
+def _response_text(response):
+    content = response.content
+    if isinstance(content, list):
+        content = '\n'.join(str(item) for item in content)
+    return content or ""
+
+def parse_plan(text, max_files=40):
+    """
+    Parse the planner's JSON file manifest. Returns [{"filename", "spec"}], or [] if there is no usable plan.
+    """
+    match = JSON_ARRAY.search(text)
+    if not match:
+        return []
+    try:
+        items = json.loads(match.group())
+    except ValueError:
+        return []
+    plan = []
+    seen = set()
+    for item in items:
+        if not isinstance(item, dict) or not isinstance(item.get("filename"), str):
+            continue
+        filename = item["filename"].strip()
+        if filename and filename not in seen:
+            seen.add(filename)
+            plan.append({"filename": filename, "spec": str(item.get("spec", "")).strip()})
+    return plan[:max_files]
+
+def format_file_section(filename, text):
+    """
+    Normalize one generated file to the `// Filename:` line followed by a single code block.
+    """
+    block = FILE_CODE_BLOCK.search(text)
+    if block:
+        language, code = block.group(1).strip(), block.group(2)
+    else:
+        language, code = "", text.strip() + "\n"
+    if filename.endswith((".ts", ".tsx")):
+        language = "typescript"
+    elif filename.endswith(".json"):
+        language = "json"
+    language = language or "typescript"
+    return f"// Filename: {filename}\n```{language}\n{code}```"
+
+def file_sections(text):
+    """
+    Return {filename: section text} for the `// Filename:` sections of an answer.
+    """
+    return {filename: text[start:end] for filename, start, end in parse_file_sections(text)}
+
+def latest_question(messages):
+    """
+    The latest user message; the first message with content if there is none.
+    """
+    for message in reversed(messages):
+        if isinstance(message, HumanMessage) and message.content:
+            return message.content
+    for message in messages:
+        if hasattr(message, "content") and message.content:
+            return message.content
+    return ""
+
+def add_copy_hint(response_content):
+    """
+    Add a 'Copy Code' hint above the first TypeScript code block.
+    """
+    if response_content and '```typescript' in response_content:
+        # Only show the copy hint above the code block, not before any explanations
+        # Split on the first code block and insert the hint
+        split_content = response_content.split('```typescript', 1)
+        before_code = split_content[0].rstrip()
+        after_code = split_content[1] if len(split_content) > 1 else ''
+        response_content = (
+            f"{before_code}\n\n<div style=\"color:#007acc;font-weight:bold;margin-bottom:4px;\">TypeScript Code (copy below):</div>\n"
+            f"```typescript{after_code}"
+        )
+    return response_content
 
 class GraphBuilder:
     def __init__(self, provider="google"):
@@ -19,6 +151,27 @@ class GraphBuilder:
         """
         self.model_loader=ModelLoader()
         self.llm = self.model_loader.load_llm(provider=provider)
+        config = load_config()
+        context_config = config.get("context", {})
+        self.context_packer = ContextPacker(
+            max_tokens=context_config.get("max_tokens", 12000),
+            chars_per_token=context_config.get("chars_per_token", 4),
+            max_overlap_chars=context_config.get("max_overlap_chars", 400),
+        )
+        fanout_config = config.get("fanout", {})
+        self.max_files = fanout_config.get("max_files", 40)
+        # Bounds the per-file LLM calls in flight across all requests served by this graph
+        self._file_slots = threading.BoundedSemaphore(fanout_config.get("max_parallel_files", 6))
+        session_config = config.get("sessions", {})
+        self.reuse_session_context = session_config.get("reuse_context", True)
+        self.session_memory = SessionMemory(
+            self.llm,
+            max_messages=session_config.get("max_messages", 12),
+            keep_messages=session_config.get("keep_messages", 6),
+        )
+        self.completeness_validator = (
+            CompletenessValidator(self.llm) if config.get("completeness", {}).get("enabled", True) else None
+        )
         # self.tools = [retriever_tool]
         self.tools = [retriever_tool]
     
@@ -26,389 +179,204 @@ class GraphBuilder:
         self.llm_with_tools = llm_with_tools
         self.graph = None
 
-    def _chatbot_node(self,state:State):
-        messages = state["messages"]
+    def _start_turn(self, state):
+        """
+        First node of every run: bound the session's history and decide whether the new
+        question refines the journey generated earlier in the session.
+        """
+        update = self.session_memory.node(state)
+        update["refinement"] = is_refinement(latest_question(state["messages"]), state.get("journey_files") or {})
+        return update
 
-                # Enhanced system prompt
-        journey_instruction = """
-SYSTEM PROMPT FOR JOURNEY CREATION (Sureify RAG Assistant, Backend + Frontend)
-You are an AI assistant for journey-based workflow automation. Users will upload journey definitions and supporting code (including constructors, automated steps, actor steps, state filters, activities, deterministic functions, React components, and helper modules) for workflows such as ownership change, legal name change, and manage beneficiaries.
-
-IMPORTANT: If a Figma link is provided in the user input or context, you MUST use Figma MCP tools to generate the frontend design to match the Figma design as closely as possible. Use the Figma design as the primary source of truth for all UI/UX, layout, and styling. If no Figma link is provided, generate the frontend using the same logic and conventions as described below.
-
-Your tasks are divided into two clear sections:
-
-BACKEND LOGIC:
-- Analyze all uploaded journey files and their supporting modules (including automated steps, actor steps, state filters, activities, deterministic functions, and helper functions) to understand the full backend workflow logic.
-- Actor and automated steps should focus on basic validation and returning data as a databag.
-- The actor step is used only to validate the data in the databag and return success/errors. The error handling logic must be present in the validate function. Actor steps do not contain any core business logic. If core functionality needs to be executed with user-entered data, a consecutive automated step should handle it, not the actor step.
-- Automated steps are responsible for handling any small logic and for calling activities or deterministic functions for any complex logic. Automated steps then return the data in the databag.
-- When generating automated steps, always:
-    - Use the structure: export function build<StepName>(dependencies, originator) => ({ ... }) satisfies ProtoAutomatedStep<...>;
-    - Use 'assignedTo: "automated"' for automated steps.
-    - Implement the 'execute' function as an async function that receives the journey instance and returns an object with the following structure:
-        - dataBag: The updated data bag, always including a files: [] property (even if empty).
-        - additionalSteps: An array (usually empty) for any additional steps.
-        - assignSteps: An object (usually empty) for step assignments.
-    - The return value of execute must match the expected type: AutomatedStepResult<YourDataBagType> (i.e., must have all required properties: dataBag, additionalSteps, assignSteps).
-    - Always include files: [] in the dataBag of the returned object, even if no files are generated.
-    - Do not cast or attempt to use a custom type for files unless you know the exact type required by your SDK.
-    - Use only one type argument for ProtoAutomatedStep, e.g. ProtoAutomatedStep<QuickQuoteHexureDataBag>. Do not pass a second argument like NoFiles.
-    - If you have unused parameters (like dependencies or originator), you can prefix them with _ to avoid TypeScript warnings, or simply leave them as-is if your linter allows.
-    - When calling dependency activities (e.g., dependencies.someActivity), always pass both the dependencies object and the parameters object as arguments.
-    - Follow the structure from working steps like buildGenerateCurrentOwnerDetails and buildCallHexureApi as a template for all new automated steps.
-    - Example return structure:
-      return {
-        dataBag: {
-          ...currentDataBag,
-          files: [],
-          // other properties
-        },
-        additionalSteps: [],
-        assignSteps: {},
-      };
-- When generating actor steps, always:
-    - Use the structure: export const build<StepName>Step = (originator, dependencies) => ({ ... }) satisfies ProtoActorStep<...>;
-    - Use 'assignedTo: { personID: originator.personID }' for actor steps.
-    - Implement the 'validate' function as an async function that checks the dataBag and returns errors as needed, using ErrorWithCode and ErrorCodes from '@coreconnect/sdk-tame/lib/errors'.
-    - Actor steps must not contain any core business logic. For any core logic, ensure a consecutive automated step is present to handle it.
-    - Use the same import paths and types as in the RAG context (e.g., DataBag, Identity, NoFiles, ProtoActorStep).
-    - Always use 'action', 'assignedTo', and 'attributes' properties as shown in the examples.
-    - For attributes, include 'sectionKey' if required for frontend mapping.
-- For every backend step, always use the same import paths and module names as found in the RAG context.
-- For each backend step, the 'action' property must have a corresponding action in the frontend JourneyPage config.
-- If a backend step or page has an 'attributes' object with a 'sectionKey', this must be matched in the frontend's 'sectionsMetadata'.
-- Never use .actor.ts or .automated.ts suffixes. Never import from ./step.actor or ./step.automated. Always import from the correct subfolder, e.g., ./actorSteps/step.
-- In the main file, define a JourneySteps section, clearly separating actor steps (user actions) and automated steps (system actions).
-- The <featureName>.ts file should import and orchestrate all step files, referencing them in the journey definition.
-- Use the structure, naming conventions, and logic found in the RAG context to create a journey that is similar to existing ones, adapting as needed for the new feature.
-- If the journey is new, infer the most appropriate steps and structure based on the closest matches in the RAG data.
-- In addition, for backend journey orchestration:
-    - The main <featureName>.ts backend file must import all required types, helpers, and step functions as shown in your provided example.
-    - All steps must be implemented in separate files under actionSteps/ and automatedSteps/ folders, with correct import paths and modular structure.
-    - The journey definition must include availabilityChecker, dependenciesConfiguration, and if required add stateFilter, matching your example.
-    - No step, dependency, or configuration should be omitted; all must be present and correctly referenced.
-    - Never combine multiple steps in a single file.
-    - Always follow the naming, import, and orchestration conventions exactly as shown in your example.
-        - The main <featureName>.ts backend file must follow this structure:
-            - Import all required types, helpers, and step functions at the top, as in the provided example.
-            - Use buildJourneyTemplate<...>(...) to define the journey, with a function that instantiates each step and returns them in order.
-            - Each step (actor or automated) must be constructed by calling its builder with the correct parameters (dependencies, originator, or originator.personID as required).
-            - The journey definition must include targetType, availabilityChecker, and dependenciesConfiguration, matching the example.
-            - All steps must be implemented in separate files and imported; do not combine multiple steps in a single file.
-            - Export the journey and any step builders as shown in the example.
-            - Follow the import, export, and configuration conventions exactly as in the example below:
-
-// Dummy Example main backend file structure:
-import { buildJourneyTemplate, Dependencies, Identity } from '@coreconnect/sdk-tame';
-import { buildStepA } from './actorSteps/buildStepA';
-import { buildStepB } from './automatedSteps/buildStepB';
-
-export interface MyJourneyDependencies extends Dependencies {
-  readonly myDependency: (params: any) => Promise<any>;
-}
-
-export const myJourney = buildJourneyTemplate<MyJourneyDependencies>(
-  (dependencies, originator) => {
-    const stepA = buildStepA(originator);
-    const stepB = buildStepB(dependencies, originator);
-    return [stepA, stepB];
-  },
-  {
-    targetType: 'Policy',
-    availabilityChecker: 'myJourneyAvailabilityChecker',
-    dependenciesConfiguration: {
-      myDependency: 'required',
-    },
-  }
-);
-export { buildStepA };
-// End dummy example
-- Additionally, for backend journey generation:
-    - In the <featureName>.ts backend file, always add an availability checker as:
-      readonly <featureName>AvailabilityChecker: (
-        params: ParamsWithIdentity<JourneyTemplateParams>
-      ) => Promise<boolean>;
-      and set availabilityChecker: '<featureName>AvailabilityChecker' in the journey definition.
-    - For automated steps, always use the syntax:
-      export const buildProcessSSNAndNavigate = (
-        dependencies: CommonWithdrawalDependencies,
-        originator: Identity
-      ) => ({
-        // ...step definition...
-      });
-      (i.e., do not use arrow functions with only parameters, always use the full function signature as shown).
-
-- CONDITIONAL: Only generate a state filter in backend/src/stateFilters/<featureName>JourneyStateFilter.ts if the journey requires step separation (e.g., multiple steppers/personas). Use the provided pattern for state filters. If not required, skip generating the state filter.
-
-Example state filter code:
-```typescript
-import {JourneyStateFilter} from '@coreconnect/sdk-tame';
-
-export const ownershipJourneyStateFilter = ((journeyState, requestorIdentity, _persona) => {
-  const originator = journeyState.steps[0].assignedTo;
-  const originatorStepsSplitIndex = journeyState.steps.findIndex(
-    step =>
-      step.assignedTo === 'unassigned' ||
-      (step.assignedTo !== 'automated' &&
-        step.assignedTo.personID !== (requestorIdentity.userID ?? requestorIdentity.personID))
-  );
-  if (
-    originator &&
-    originator !== 'unassigned' &&
-    originator !== 'automated' &&
-    originator.personID === (requestorIdentity.userID ?? requestorIdentity.personID)
-  ) {
-    const hasReviewNewOwnerChanges = journeyState.steps.some(step => step.action === 'reviewNewOwnerChanges');
-    return {
-      ...journeyState,
-      steps: journeyState.steps.filter(
-        step =>
-          step.action === 'collectOwnerChangeType' ||
-          step.action === 'collectNewOwnerInformation' ||
-          step.action === 'agreement' ||
-          step.action === 'reassignToFrictionFreeUser' ||
-          step.action === 'triggerEmail' ||
-          step.action === 'storeOwnerDetails' ||
-          step.action === 'reviewNewOwnerChanges' ||
-          step.action === 'copyNewOwnerChanges' ||
-          (hasReviewNewOwnerChanges ? false : step.action === 'editOwnerEmail') ||
-          step.action === 'wrapUpOwnershipChange'
-      ),
-    };
-  } else if (
-    originator &&
-    originator !== 'unassigned' &&
-    originator !== 'automated' &&
-    originator.personID !== (requestorIdentity.userID ?? requestorIdentity.personID)
-  ) {
-    return {
-      ...journeyState,
-      steps: journeyState.steps.filter(
-        step =>
-          step.action === 'confirmInformation' ||
-          step.action === 'uploadProofOfIdentity' ||
-          step.action === 'confirmAgreement' ||
-          step.action === 'storeOwnerDetails' ||
-          step.action === 'checkIfReviewRequiredByOwner' ||
-          step.action === 'copyNewOwnerChanges' ||
-          step.action === 'wrapUpOwnershipChange'
-      ),
-    };
-  }
-  return {...journeyState, steps: journeyState.steps.slice(originatorStepsSplitIndex)};
-}) satisfies JourneyStateFilter;
-```
-
-- MANDATORY: For every new journey, implement and wire up <featureName>AvailabilityChecker as follows:
-    1. Create backend/src/activities/dependencies/<featureName>AvailabilityChecker/<featureName>AvailabilityChecker.ts with:
-        import {buildDependencyAsActivity, Dependencies} from '@coreconnect/sdk-tame';
-        import {PostgresQuery} from '@coreconnect/sdk-wild/lib/activities/dependencies/db/client';
-        export interface <FeatureName>AvailabilityCheckerDependencies extends Dependencies {
-          readonly postgresQuery: PostgresQuery;
-        }
-        const build<FeatureName>AvailabilityChecker = () =>
-          buildDependencyAsActivity<
-              <FeatureName>AvailabilityCheckerDependencies['<featureName>AvailabilityChecker'],
-              <FeatureName>AvailabilityCheckerDependencies
-          >(
-            async (_dependencies, _parameters) => {
-              return true;
-            },
-            {
-              dependenciesConfiguration: {
-                postgresQuery: 'required',
-              },
-            }
-          );
-        export const <featureName>AvailabilityChecker = build<FeatureName>AvailabilityChecker();
-    2. Add an index.ts in the same folder to export <featureName>AvailabilityChecker.
-    3. Export <featureName>AvailabilityChecker from backend/src/activities/dependencies/index.ts.
-    4. Export <featureName>AvailabilityChecker from backend/src/workflows/read/customActivities/index.ts.
-    5. In backend/src/workflows/write/registry.ts, import {<featureName>} from './<featureName>'; and add it to carrierWorkflows.
-    6. In backend/src/worker.ts, import {<featureName>AvailabilityChecker} from './activities'; and configure it in TemporalWorker as:
-        .configureActivities('Carrier', {<featureName>AvailabilityChecker })
-    7. All the backend files of both action and automated steps and types should be in backend/src/workflows/write/<featureName>/
-      - The main file should also be in this folder as <featureName>.ts, importing and orchestrating all action and automated steps.
-
-FRONTEND LOGIC:
-- When generating frontend UI, always match the design tokens (colors, typography, spacing), layout, and component structure from the provided Figma design. Use portals-common and MUI as base components, but override styles and structure as needed to achieve pixel-perfect fidelity with Figma. Reference Figma for all visual details, assets, and interactions. If a Figma link is provided, use it as the primary source of truth for UI.
-- For every new journey, generate all frontend code (including React stepper components and action screens) that follows the patterns, structure, and best practices found in the uploaded examples.
-- The main journey component should be named <FeatureName>JourneyComponent.tsx and should orchestrate the journey steps using a stepper or page-based navigation, following the structure of existing journeys (e.g., OwnershipChangeJourneyComponent).
-- The main entry point should be <FeatureName>Journey.tsx and <featureName>JourneyPage.tsx, with each action/step in its own folder under actions/.
-- In the JourneyPage config, the `actions` object must include an entry for each backend step's `action` property, mapping to the corresponding frontend action/component (e.g., `collectNewOwnerInformation: NewOwnerInformationAction`).
-- The `sectionsMetadata` object must include an entry for each backend `sectionKey` (from attributes), ensuring that action bar tabs/sections are displayed as required. The sectionKey names must match exactly between backend and frontend.
-- For navigation between screens, always implement handleNext() with databag parameters and integrate with the coreconnect SDK API, following the patterns found in the RAG context.
-- For each frontend action, follow these conventions:
-    - Export an object (e.g., `NewOwnerInformationAction`) with at least `actionComponent`, `actionLabels`, and `customStepSx` properties, using the ActionConfig type.
-    - The `actionComponent` should be a React component that uses `useForm` from `react-hook-form` for form state and validation.
-    - Prefer importing UI and utility functions from `portals-common` (e.g., `generatePrefixedFieldName`, `ActionComponent`, `ActionConfig`, `JourneyActionBuilderParams`, `Spacing`, `Email`, `Telephone`, `Text`, `states`, `DateField`, `regularExpressions`) for form fields, validation, and logic. Use MUI only for layout and styling not covered by `portals-common`.
-    - All frontend types (e.g., DataBag types, step types) must be generated and maintained separately in the frontend codebase. Do not import types directly from backend; instead, generate and use dedicated TypeScript types in the frontend for each journey and step.
-    - Use utility functions (e.g., `generatePrefixedFieldName`, `validateName`, `validateMiddleName`) and constants (e.g., `states`) as in the RAG context.
-    - Implement field validation and error handling as shown in the examples, including custom validation logic and regular expressions.
-    - Use i18next for labels and titles if present in the RAG context.
-    - Use `context.updateCurrentStepDataBag` and `context.handleNext({ params: dataBag })` to update state and navigate steps.
-    - Use `useRef` for initial values and ensure all fields are pre-populated from `stepData` or `dataBag` if available.
-    - Ensure accessibility and clarity in form fields, labels, and error messages.
-- For every new journey, generate a corresponding frontend folder under frontend/lifetime-service/src/journeys/<featureName>/.
-- Each action step should have its own folder and file under actions/<stepName>/<StepName>.tsx.
-- Use the same import paths, component structure, and code style as in the provided frontend journey code.
-- For each step, generate a React component that matches the UI/UX and validation patterns of the RAG context (e.g., using react-hook-form, MUI, and portals-common components).
-- If the journey includes file uploads, state filters, or email sending, generate the corresponding frontend logic and UI components, following the patterns in the RAG context.
-- Organize all frontend code in a modular, folder-based structure, matching the conventions of the existing journeys.
-- Always explain your reasoning and reference relevant parts of the uploaded code.
-- If you are asked for code, generate TypeScript (and TSX for React) code that matches the style, imports, and conventions of the uploaded files.
-- For every new journey, generate a corresponding i18n translation file for all frontend UI text. The translation file must be named `journeyComponents.json` and placed at `frontend/lifetime-service/src/i18n/locales/en/journeyComponents.json`. The file must contain a top-level object keyed by the feature name (e.g., "withdrawal"), with all UI text (titles, headers, finalStep, etc.) as nested properties, following this example:
-
-{
-  "withdrawal": {
-    "title": "Withdrawal",
-    "header": {
-      "title": "Withdrawal Request",
-      "subTitle": "Easily request a withdrawal from your selected life insurance policy using our secure online form."
-    },
-    "finalStep": {
-      "title": "Withdrawal request submitted",
-      "subTitle": "Your withdrawal request has been submitted. You can check back here to see if the request has been processed. Please allow 1-3 business days for the withdrawal to be reflected on your policy.",
-      "done": "Done"
-    }
-    // ...other keys as needed
-  }
-}
-
-- All frontend UI text must use i18next translation keys and reference the generated journeyComponents.json file.
-
-MANDATORY: Only generate frontend journey components using <JourneyPage<DataBagsType> config={{ ... }} /> with all required config keys and hooks, matching the original example. Never generate manual steppers, custom action maps, or any structure that deviates from the provided example. Export the journey page as a config object with name, component, type, and route (if required). Any deviation is incorrect.
-
----
-
-EXTRA SYSTEM PROMPT: Summary of Fixes for Actor Steps and Workflow Code
-Type Safety for Step Builders
-- Ensure all actor step builder functions (e.g., buildMygaDataCaptureStep) receive an Identity object with a valid personID property.
-- All usages and tests must always provide a personID when constructing or mocking Identity.
-Type-Safe DataBag Access
-- When accessing properties on dataBag (e.g., dataBag.product), cast dataBag to the correct type (e.g., QuickQuoteHexureDataBag) to avoid TypeScript property errors.
-ProtoStep and ProtoAutomatedStep Compliance
-- All actor and automated step objects must strictly conform to the SDK’s ProtoActorStep and ProtoAutomatedStep types.
-- For actor steps, the validate method returns a Promise<readonly ValidationError[]> (usually return [] for no errors).
-- For automated steps, the execute method returns an object matching the expected result type, with all required properties.
-Return Object Structure
-- For automated steps, construct the dataBag in the return value explicitly, matching the expected type exactly (no extra or missing properties).
-- Ensure the files property is typed as readonly File[] if required, or omitted if not part of the expected result type.
-No Extra Properties
-- Remove any properties from return objects that are not explicitly allowed by the SDK types (e.g., do not include files if not in the type).
-Type Casting for API Results
-- When storing API results (e.g., quoteResults), cast them to the exact type expected by the data bag (e.g., quoteResults as QuickQuoteHexureDataBag['quoteResults']).
-Unused Parameter Warnings
-- Ignore or remove unused parameters (e.g., originator) if not required by the function.
-- There is no execute function for actor steps; only automated steps have execute.
-"""
-        # Retrieve context from RAG (vector DB) using retriever_tool
-        user_question = None
-        for msg in messages:
-            if hasattr(msg, "content") and msg.content:
-                user_question = msg.content
-                break
-        if not user_question:
-            user_question = ""
-        # Call retriever_tool to get relevant context
-        rag_results = retriever_tool.invoke({"question": user_question})
-        rag_context = "\n\n".join([doc.page_content for doc in rag_results]) if rag_results else ""
+    def _retrieve_context(self, state):
+        """
+        Return (question, packed RAG context, state update) for the latest question in the state.
+        Refinements of a session's journey reuse the context of the question that generated it.
+        """
+        user_question = latest_question(state["messages"])
+        retrievals = state.get("retrievals") or {}
+        update = {}
+        # A refinement like "rename the second step" would retrieve poorly on its own
+        context_question = state.get("context_question")
+        if not (self.reuse_session_context and state.get("refinement") and context_question):
+            context_question = user_question
+        # Retrieve once per question; loops back from the tools node reuse the stored result.
+        # Keys include the index generation, so a re-indexed store forces a fresh retrieval
+        key = retrieval_key(context_question)
+        rag_results = retrievals.get(key)
+        if rag_results is None:
+            rag_results = retrieve_documents(context_question)
+            update["retrievals"] = {key: rag_results}
+        elif context_question != user_question:
+            print("Reusing session context")
+        else:
+            print("Reusing retrieval from graph state")
+        update["context_question"] = context_question
+        # Merge adjacent chunks, drop repeats and overlap, and stay within the token budget
+        packed = self.context_packer.pack(rag_results or [])
+        rag_context = packed.text
+        print(f"Packed context: {packed.tokens} tokens from {len(packed.included)} chunks, "
+              f"{len(packed.dropped)} dropped for budget, {packed.duplicates} duplicates removed")
+        emit_progress("context_packed", packed.to_dict())
+        return user_question, rag_context, update
+
+    def _chatbot_node(self, state):
+        # Unannotated, so the fan-out topology passes its full state (including rag_context)
+        messages = state["messages"]
+        if state.get("rag_context") is not None:
+            # Fan-out topology: the retrieve node already packed this turn's context
+            rag_context, update = state["rag_context"], {}
+        else:
+            _, rag_context, update = self._retrieve_context(state)
+        # Only a refinement builds on the session's files; a new question starts a new journey
+        previous_files = (state.get("journey_files") or {}) if state.get("refinement") else {}
 
         print("\n--- RAG CONTEXT FOR LLM ---\n", rag_context, "\n--- END RAG CONTEXT ---\n")
 
-        # Compose the prompt with RAG context
-        prompt = journey_instruction
-        # Add strict output format instructions for LLM
-        prompt += """
-
-IMPORTANT OUTPUT FORMAT INSTRUCTIONS (MANDATORY):
-- For every code file, output in this format:
-  // Filename: <relative/path/to/file.ts>
-  ```typescript
-  // code here
-  ```
-- The // Filename: line must be the very first line of each file section (no explanation or markdown before it).
-- The code block must immediately follow the filename line (no explanation or markdown between the filename and code block).
-- If you want to provide explanations, put them before or after all file sections, never between the filename and code block.
-- If you generate multiple files, separate each file section with a blank line.
-- Do not output any code outside of code blocks. Do not mix explanations or comments inside code blocks.
-- Explanations must be in markdown, below the code block, and must not break code copyability.
-- If you cannot generate code, ask the user for clarification, but never respond with only explanations or information.
-"""
-        # --- ADDITIONAL SYSTEM PROMPT FOR ACTOR STEP TYPE SAFETY AND SDK COMPLIANCE ---
-#         prompt += """
-
-# EXTRA SYSTEM PROMPT: ACTOR STEP AND WORKFLOW TYPE SAFETY & SDK COMPLIANCE
-# Summary of Fixes for Actor Steps and Workflow Code
-# - Type Safety for Step Builders:
-#   - All actor step builder functions (e.g., buildMygaDataCaptureStep) must receive an Identity object with a valid personID property.
-#   - All usages and tests must always provide a personID when constructing or mocking Identity.
-# - Type-Safe DataBag Access:
-#   - When accessing properties on dataBag (e.g., dataBag.product), always cast dataBag to the correct type (e.g., QuickQuoteHexureDataBag) to avoid TypeScript property errors.
-# - ProtoStep and ProtoAutomatedStep Compliance:
-#   - All actor and automated step objects must strictly conform to the SDK’s ProtoActorStep and ProtoAutomatedStep types.
-#   - For actor steps, the validate method must return a Promise<readonly ValidationError[]> (usually return [] for no errors).
-#   - For automated steps, the execute method must return an object matching the expected result type, with all required properties.
-# - Return Object Structure:
-#   - For automated steps, construct the dataBag in the return value explicitly, matching the expected type exactly (no extra or missing properties).
-#   - The files property must be typed as readonly File[] if required, or omitted if not part of the expected result type.
-# - No Extra Properties:
-#   - Remove any properties from return objects that are not explicitly allowed by the SDK types (e.g., do not include files if not in the type).
-# - Type Casting for API Results:
-#   - When storing API results (e.g., quoteResults), cast them to the exact type expected by the data bag (e.g., quoteResults as QuickQuoteHexureDataBag['quoteResults']).
-# - Unused Parameter Warnings:
-#   - Ignore or remove unused parameters (e.g., originator) if not required by the function.
-# - Actor Step Restrictions:
-#   - There is no execute function for actor steps. Only automated steps have an execute function.
-# """
-        if rag_context:
-            prompt += f"\n\nRelevant context from your uploaded data:\n{rag_context}\n\n"
-        if messages and hasattr(messages[0], "content"):
-            modified_messages = messages.copy()
-            modified_messages[0].content = prompt + modified_messages[0].content
-        else:
-            modified_messages = messages
+        # Static system message first, then the conversation with this request's context;
+        # state["messages"] itself is never modified, so loops through the tools don't grow the prompt.
+        # In a session, earlier files are listed so a refinement only regenerates what changes.
+        prompt_messages = build_prompt_messages(
+            messages, rag_context, summary=state.get("summary", ""), existing_files=list(previous_files)
+        )
 
         # Invoke LLM and unwrap message content
-        response = self.llm_with_tools.invoke(modified_messages)
+        response = self.llm_with_tools.invoke(prompt_messages)
+
+        # Tool calls go back to the graph as-is: tools_condition routes them to the tools node,
+        # which runs retriever_tool and loops back here with its ToolMessage
+        if response.tool_calls:
+            update["messages"] = messages + [response]
+            return update
 
         # If the response is a list, join as string
         response_content = response.content
         if isinstance(response_content, list):
             response_content = '\n'.join(str(item) for item in response_content)
 
-        # If the response contains only a single file or code block, prompt again for full structure
-        if response_content and response_content.count('// Filename:') < 2:
-            followup_prompt = "Please generate the full journey structure with all backend and frontend files, as in the uploaded examples."
-            followup_messages = messages + [HumanMessage(content=followup_prompt)]
-            response2 = self.llm_with_tools.invoke(followup_messages)
-            response_content2 = response2.content
-            if isinstance(response_content2, list):
-                response_content2 = '\n'.join(str(item) for item in response_content2)
-            if response_content2.count('// Filename:') > response_content.count('// Filename:'):
-                response_content = response_content2
+        # If parts of the journey are missing, ask for just those files and merge them in
+        if response_content and self.completeness_validator is not None:
+            response_content, completeness = self.completeness_validator.complete(
+                prompt_messages, response_content, known_files=list(previous_files)
+            )
+            emit_progress("completeness_checked", completeness)
+
+        changed_files = file_sections(response_content)
+        if changed_files:
+            update["journey_files"] = {**previous_files, **changed_files}
+        unchanged = [filename for filename in previous_files if filename not in changed_files]
+        if changed_files and unchanged:
+            response_content += "\n\nUnchanged files from the previous answer:\n" + "\n".join(
+                f"- {filename}" for filename in unchanged
+            )
 
         # If the response contains a TypeScript code block, highlight it for copy-paste
-        # and add a 'Copy Code' hint above the code block
-        if response_content and '```typescript' in response_content:
-            # Only show the copy hint above the code block, not before any explanations
-            # Split on the first code block and insert the hint
-            split_content = response_content.split('```typescript', 1)
-            before_code = split_content[0].rstrip()
-            after_code = split_content[1] if len(split_content) > 1 else ''
-            response_content = (
-                f"{before_code}\n\n<div style=\"color:#007acc;font-weight:bold;margin-bottom:4px;\">TypeScript Code (copy below):</div>\n"
-                f"```typescript{after_code}"
+        response_content = add_copy_hint(response_content)
+
+        update["messages"] = messages + [AIMessage(content=response_content)]
+        update["failed_files"] = []
+        return update
+
+    def _retrieve_node(self, state: FanoutState):
+        question, rag_context, update = self._retrieve_context(state)
+        update.update({"question": question, "rag_context": rag_context})
+        return update
+
+    def _planner_node(self, state: FanoutState):
+        prompt_messages = build_prompt_messages(state["messages"], state["rag_context"])
+        response = self.llm.invoke(prompt_messages + [HumanMessage(content=PLANNER_PROMPT)])
+        plan = parse_plan(_response_text(response), max_files=self.max_files)
+        print(f"Planned {len(plan)} files")
+        emit_progress("plan_ready", {"files": len(plan)})
+        return {"plan": plan, "files": None}
+
+    def _route_plan(self, state: FanoutState):
+        """
+        Fan out one generate_file task per planned file, or fall back to single-shot generation without a plan.
+        """
+        if not state.get("plan"):
+            return "chatbot"
+        return [
+            Send("generate_file", {
+                "messages": state["messages"],
+                "rag_context": state["rag_context"],
+                "plan": state["plan"],
+                "index": index,
+            })
+            for index in range(len(state["plan"]))
+        ]
+
+    def _generate_file_node(self, task: FileTask):
+        file = task["plan"][task["index"]]
+        manifest = "\n".join(f"- {item['filename']}: {item['spec']}" for item in task["plan"])
+        prompt_messages = build_prompt_messages(task["messages"], task["rag_context"]) + [
+            HumanMessage(content=FILE_PROMPT.format(filename=file["filename"], spec=file["spec"], manifest=manifest))
+        ]
+        try:
+            with self._file_slots:
+                response = self.llm.invoke(prompt_messages)
+            section = format_file_section(file["filename"], _response_text(response))
+            error = None
+        except Exception as e:
+            print(f"Generating {file['filename']} failed: {e}")
+            section, error = None, str(e)
+        emit_progress("file_generated", {"filename": file["filename"], "ok": error is None})
+        return {"files": [{"index": task["index"], "filename": file["filename"], "content": section, "error": error}]}
+
+    def _merge_node(self, state: FanoutState):
+        files = sorted(state.get("files") or [], key=lambda item: item["index"])
+        sections = [item["content"] for item in files if item["content"]]
+        failed = [item["filename"] for item in files if not item["content"]]
+        response_content = "\n\n".join(sections)
+        if failed:
+            response_content += "\n\nThese planned files could not be generated, please ask for them again:\n" + "\n".join(
+                f"- {filename}" for filename in failed
             )
-
+        # journey_files keeps only what was generated, so a follow-up's completeness check still sees the gaps
         return {
-            "messages": messages + [AIMessage(content=response_content)]
+            "messages": [AIMessage(content=add_copy_hint(response_content))],
+            "journey_files": {item["filename"]: item["content"] for item in files if item["content"]},
+            "failed_files": failed,
         }
 
+    def _route_turn(self, state: FanoutState):
+        """
+        Plan a new journey; refinements of one generated earlier in the session edit it in place.
+        """
+        return "chatbot" if state.get("refinement") else "planner"
+
+    def build_fanout(self):
+        """
+        Plan-then-fan-out topology: memory -> retrieve -> planner -> one generate_file per planned file
+        (in parallel) -> merge. Falls back to the single-shot chatbot node when the planner returns no
+        usable plan, and uses it for session follow-ups that refine an already generated journey.
+        """
+        graph_builder = StateGraph(FanoutState)
+
+        graph_builder.add_node("memory", self._start_turn)
+        graph_builder.add_node("retrieve", self._retrieve_node)
+        graph_builder.add_node("planner", self._planner_node)
+        graph_builder.add_node("generate_file", self._generate_file_node)
+        graph_builder.add_node("merge", self._merge_node)
+        graph_builder.add_node("chatbot", self._chatbot_node)
+        graph_builder.add_node("tools", ToolNode(tools=self.tools))
+
+        graph_builder.add_edge(START, "memory")
+        graph_builder.add_edge("memory", "retrieve")
+        graph_builder.add_conditional_edges("retrieve", self._route_turn, ["planner", "chatbot"])
+        graph_builder.add_conditional_edges("planner", self._route_plan, ["generate_file", "chatbot"])
+        graph_builder.add_edge("generate_file", "merge")
+        graph_builder.add_edge("merge", END)
+        graph_builder.add_conditional_edges("chatbot", tools_condition)
+        graph_builder.add_edge("tools", "chatbot")
+
+        self.graph = graph_builder.compile()
+
     def build(self):
         graph_builder = StateGraph(State)
 
+        # Trims and summarizes long session histories (a no-op for single-turn requests) and classifies the turn
+        graph_builder.add_node("memory", self._start_turn)
         graph_builder.add_node("chatbot", self._chatbot_node)
 
         tool_node=ToolNode(tools=self.tools)
@@ -416,7 +384,8 @@ IMPORTANT OUTPUT FORMAT INSTRUCTIONS (MANDATORY):
 
         graph_builder.add_conditional_edges("chatbot", tools_condition)
         graph_builder.add_edge("tools", "chatbot")
-        graph_builder.add_edge(START, "chatbot")
+        graph_builder.add_edge(START, "memory")
+        graph_builder.add_edge("memory", "chatbot")
 
         self.graph = graph_builder.compile()
 
@@ -0,0 +1,106 @@
+"""
+Compare query latency of the NumPy brute-force store against Chroma on synthetic corpora.
+
+Embeddings are precomputed random vectors, so the numbers measure search only (no model inference).
+Quantized NumPy stores also report recall@k against exact full-precision search, with and
+without rescoring, and the size of the in-memory search matrix.
+
+    python benchmark_vector_store.py --sizes 1000 10000 100000 --queries 50
+"""
+import argparse
+import shutil
+import tempfile
+import time
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from utils.numpy_vector_store import NumpyVectorStore
+
+class PrecomputedEmbeddings(Embeddings):
+    """
+    Serves fixed vectors by text, so both stores index and query identical embeddings.
+    """
+    def __init__(self, vectors):
+        self.vectors = vectors
+
+    def embed_documents(self, texts):
+        return [self.vectors[text] for text in texts]
+
+    def embed_query(self, text):
+        return self.vectors[text]
+
+def make_corpus(size, queries, dim, seed=0):
+    rng = np.random.default_rng(seed)
+    doc_vectors = rng.standard_normal((size, dim)).astype(np.float32)
+    # Queries are perturbed corpus rows, like real questions that land near some chunks
+    picks = rng.integers(0, size, queries)
+    query_vectors = doc_vectors[picks] + 0.5 * rng.standard_normal((queries, dim)).astype(np.float32)
+    vectors = {f"doc-{i}": vector.tolist() for i, vector in enumerate(doc_vectors)}
+    vectors.update({f"query-{i}": vector.tolist() for i, vector in enumerate(query_vectors)})
+    return [f"doc-{i}" for i in range(size)], [f"query-{i}" for i in range(queries)], vectors
+
+def time_queries(store, queries, k):
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        store.similarity_search_with_score(query, k=k)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return np.percentile(latencies, 50), np.percentile(latencies, 95)
+
+def build_numpy(texts, embedding, directory, quantization):
+    store = NumpyVectorStore(embedding=embedding, persist_directory=directory, quantization=quantization)
+    store.add_texts(texts, ids=texts)
+    return store
+
+def build_chroma(texts, embedding, directory, batch_size=5000):
+    from langchain_community.vectorstores import Chroma
+    store = Chroma(embedding_function=embedding, persist_directory=directory)
+    for start in range(0, len(texts), batch_size):
+        batch = texts[start:start + batch_size]
+        store.add_texts(batch, ids=batch)
+    return store
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--k", type=int, default=18)
+    parser.add_argument("--skip-chroma", action="store_true")
+    args = parser.parse_args()
+
+    print(
+        f"{'store':<16}{'chunks':>10}{'build s':>10}{'p50 ms':>10}{'p95 ms':>10}"
+        f"{'search MB':>11}{'recall':>9}{'rescored':>10}"
+    )
+    for size in args.sizes:
+        texts, queries, vectors = make_corpus(size, args.queries, args.dim)
+        embedding = PrecomputedEmbeddings(vectors)
+        builders = [
+            (f"numpy-{mode}", lambda directory, mode=mode: build_numpy(texts, embedding, directory, mode))
+            for mode in ("none", "float16", "int8")
+        ]
+        if not args.skip_chroma:
+            builders.append(("chroma", lambda directory: build_chroma(texts, embedding, directory)))
+
+        for name, build in builders:
+            directory = tempfile.mkdtemp(prefix=f"bench_{name}_")
+            try:
+                start = time.perf_counter()
+                store = build(directory)
+                build_seconds = time.perf_counter() - start
+                p50, p95 = time_queries(store, queries, args.k)
+                line = f"{name:<16}{size:>10}{build_seconds:>10.1f}{p50:>10.2f}{p95:>10.2f}"
+                if isinstance(store, NumpyVectorStore):
+                    report = store.recall_at_k([vectors[query] for query in queries], k=args.k)
+                    line += (
+                        f"{report['quantized_bytes'] / 2**20:>11.1f}"
+                        f"{report['recall_at_k']:>9.3f}{report['recall_at_k_rescored']:>10.3f}"
+                    )
+                print(line)
+            except ImportError as e:
+                print(f"{name:<16}{size:>10}  skipped: {e}")
+            finally:
+                shutil.rmtree(directory, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,47 @@
+import multiprocessing
 import os
-import tempfile
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from typing import List
 from dotenv import load_dotenv
 from langchain_core.documents import Document
-from langchain_community.document_loaders import PyPDFLoader, Docx2txtLoader, CSVLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_pinecone import PineconeVectorStore
 from utils.model_loaders import ModelLoader
 from utils.config_loader import load_config
-from utils.csv_processor import process_csv_for_vector_db, examine_csv_file
-from pinecone import ServerlessSpec, Pinecone
-from uuid import uuid4
 import sys
 from exception.exceptions import AlayticsBotException
-from utils.chroma_db_store import ChromaDBVectorStore
+from utils.vector_stores import configured_vector_store_type, get_vector_store, legacy_chunk_ids, write_session
+from utils.index_generation import bump_index_generation
+from utils.ingestion_manifest import IngestionManifest, assign_chunk_ids
+from utils.batch_planner import BatchWriter, plan_batches
+from utils.lexical_index import get_lexical_index, lexical_index_path
+from utils.symbol_index import get_symbol_index, symbol_index_path
+from data_ingestion.progress import IngestionProgress
+from data_ingestion.uploads import TEXT_EXTENSIONS
+from data_ingestion.parsers import PARSERS, parse_pdf_pages, pdf_page_count
+
+_parse_pool = None
+_parse_pool_lock = threading.Lock()
+_manifest_locks = {}
+_manifest_locks_lock = threading.Lock()
+
+def _manifest_lock(path):
+    """
+    Lock serializing ingestion jobs that share a manifest file, so their read-modify-write
+    cycles (and the index updates derived from them) don't interleave.
+    """
+    with _manifest_locks_lock:
+        return _manifest_locks.setdefault(os.path.abspath(path), threading.Lock())
+
+def _run_inline(func, *args):
+    # Single-task batches are parsed in-process; a pool round trip would cost more than it saves
+    future = Future()
+    try:
+        future.set_result(func(*args))
+    except Exception as e:
+        future.set_exception(e)
+    return future
 
 class DataIngestion:
     """
@@ -49,157 +77,217 @@ class DataIngestion:
         except Exception as e:
             raise AlayticsBotException(e, sys)
 
-    def load_documents(self, uploaded_files) -> List[Document]:
+    def _get_parse_pool(self):
+        """
+        Shared process pool for CPU-bound parsing. Workers are spawned (not forked) so they
+        don't inherit the server's threads and loaded models.
+        """
+        global _parse_pool
+        with _parse_pool_lock:
+            if _parse_pool is None:
+                workers = self.config.get("ingestion", {}).get("parse_workers") or os.cpu_count() or 1
+                _parse_pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            return _parse_pool
+
+    def _reset_parse_pool(self):
+        global _parse_pool
+        with _parse_pool_lock:
+            if _parse_pool is not None:
+                _parse_pool.shutdown(wait=False, cancel_futures=True)
+            _parse_pool = None
+
+    def _parse_tasks(self, uploaded_file):
+        """
+        Split one staged upload into parsing tasks: (function, args). Large PDFs are split by page range.
+        """
+        file_ext = uploaded_file.extension
+        if file_ext == ".pdf":
+            pages_per_task = self.config.get("ingestion", {}).get("pdf_pages_per_task", 20)
+            page_count = pdf_page_count(uploaded_file.path)
+            return [
+                (parse_pdf_pages, (uploaded_file.path, uploaded_file.filename, start, start + pages_per_task))
+                for start in range(0, max(page_count, 1), pages_per_task)
+            ]
+        if file_ext in PARSERS:
+            return [(PARSERS[file_ext], (uploaded_file.path, uploaded_file.filename))]
+        return []
+
+    def load_documents(self, uploaded_files, progress=None) -> List[Document]:
+        """
+        Parse staged uploads (see data_ingestion.uploads.stage_uploads) into documents.
+
+        PDF, DOCX and CSV parsing fans out over a process pool (and over page ranges for large PDFs).
+        Documents come back in upload order, and a file that fails to parse is reported in
+        `progress` without aborting the rest of the batch.
+        """
         try:
-            documents = []
+            progress = progress or IngestionProgress()
+            tasks_by_file = []
             for uploaded_file in uploaded_files:
-                file_ext = os.path.splitext(uploaded_file.filename)[1].lower()
-                suffix = file_ext if file_ext in [".pdf", ".docx", ".csv", ".txt",".ts",".tsx"] else ".tmp"
-
-                with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as temp_file:
-                    temp_file.write(uploaded_file.file.read())
-                    temp_path = temp_file.name
-
-                if file_ext == ".pdf":
-                    loader = PyPDFLoader(temp_path)
-                    documents.extend(loader.load())
-                elif file_ext == ".docx":
-                    loader = Docx2txtLoader(temp_path)
-                    documents.extend(loader.load())
-                elif file_ext == ".csv":
-                    # First, examine the CSV file to help with debugging
-                    print(f"Examining CSV file: {uploaded_file.filename}")
-                    examine_csv_file(temp_path)
-
-                    # Use our custom CSV processor for better handling of structured data
-                    print(f"Processing CSV file with custom processor: {uploaded_file.filename}")
-                    csv_docs = process_csv_for_vector_db(temp_path)
-
-                    # Add additional processing for better retrieval
-                    for doc in csv_docs:
-                        # Add filename to metadata
-                        doc.metadata["source"] = uploaded_file.filename
-
-                        # Add a special section for common queries about user IDs and event types
-                        if "userid" in doc.metadata and "eventtype" in doc.metadata:
-                            doc.page_content += f"\n\nThis record contains user ID {doc.metadata['userid']} with event type {doc.metadata['eventtype']}."
-
-                    print(f"Processed {len(csv_docs)} rows from CSV file")
-                    documents.extend(csv_docs)
-                elif file_ext == ".txt":
-                    # Simple text loader for .txt files
-                    with open(temp_path, 'r', encoding='utf-8') as f:
-                        text_content = f.read()
-                    doc = Document(page_content=text_content, metadata={"source": uploaded_file.filename})
-                    documents.append(doc)
-                elif file_ext == ".ts":
-                    # Simple text loader for .ts files
-                    with open(temp_path, 'r', encoding='utf-8') as f:
-                        text_content = f.read()
-                    doc = Document(page_content=text_content, metadata={"source": uploaded_file.filename})
-                    documents.append(doc)
-                elif file_ext == ".tsx":
-                    # Simple text loader for .tsx files
-                    with open(temp_path, 'r', encoding='utf-8') as f:
-                        text_content = f.read()
-                    doc = Document(page_content=text_content, metadata={"source": uploaded_file.filename})
+                try:
+                    tasks = [] if uploaded_file.extension in TEXT_EXTENSIONS else self._parse_tasks(uploaded_file)
+                except Exception as e:
+                    tasks = e
+                tasks_by_file.append(tasks)
+
+            task_count = sum(len(tasks) for tasks in tasks_by_file if isinstance(tasks, list))
+            if task_count > 1:
+                pool = self._get_parse_pool()
+                submit = pool.submit
+            else:
+                pool = None
+                submit = _run_inline
+
+            try:
+                futures_by_file = [
+                    tasks if isinstance(tasks, Exception) else [submit(func, *args) for func, args in tasks]
+                    for tasks in tasks_by_file
+                ]
+            except BrokenProcessPool:
+                self._reset_parse_pool()
+                raise
+
+            documents = []
+            for uploaded_file, futures in zip(uploaded_files, futures_by_file):
+                file_ext = uploaded_file.extension
+                if file_ext in TEXT_EXTENSIONS:
+                    # .txt / .ts / .tsx uploads are decoded in memory, no temp file involved
+                    doc = Document(page_content=uploaded_file.text, metadata={"source": uploaded_file.filename})
                     documents.append(doc)
-                else:
+                elif isinstance(futures, Exception):
+                    progress.add_error(f"Failed to parse {uploaded_file.filename}: {futures}")
+                elif not futures:
                     print(f"Unsupported file type: {uploaded_file.filename}")
+                    progress.add_error(f"Unsupported file type: {uploaded_file.filename}")
+                else:
+                    try:
+                        file_documents = []
+                        for future in futures:
+                            file_documents.extend(future.result())
+                        documents.extend(file_documents)
+                    except BrokenProcessPool as e:
+                        self._reset_parse_pool()
+                        progress.add_error(f"Failed to parse {uploaded_file.filename}: {e}")
+                    except Exception as e:
+                        progress.add_error(f"Failed to parse {uploaded_file.filename}: {e}")
+                progress.incr("files_parsed")
             return documents
         except Exception as e:
             raise AlayticsBotException(e, sys)
 
-    def store_in_vector_db(self, documents: List[Document], vector_store_type="chroma"):
+    def store_in_vector_db(self, documents: List[Document], vector_store_type=None, progress=None, replace=False):
+        """
+        Split, deduplicate and write documents. Unchanged chunks are skipped; with `replace`, each
+        uploaded source is treated as the new version of the stored source of the same name and
+        its chunks that are gone are deleted.
+        """
         try:
+            progress = progress or IngestionProgress()
+            vector_store_type = vector_store_type or configured_vector_store_type(self.config)
             text_splitter = RecursiveCharacterTextSplitter(
                 chunk_size=2000,  # Increased chunk size to keep more context together
                 chunk_overlap=200,
                 length_function=len
             )
             documents = text_splitter.split_documents(documents)
+            progress.set("chunks_total", len(documents))
 
-            if vector_store_type == "pinecone":
-                pinecone_client = Pinecone(api_key=self.pinecone_api_key)
-                index_name = self.config["vector_db"]["index_name"]
-
-                if index_name not in [i.name for i in pinecone_client.list_indexes()]:
-                    pinecone_client.create_index(
-                        name=index_name,
-                        dimension=384,  # adjust if needed based on embedding model
-                        metric="cosine",
-                        spec=ServerlessSpec(cloud="aws", region="us-east-1"),
-                    )
-
-                index = pinecone_client.Index(index_name)
-                vector_store = PineconeVectorStore(index=index, embedding=self.model_loader.load_embeddings())
-            elif vector_store_type == "chroma":
-                vector_store = ChromaDBVectorStore(embedding=self.model_loader.load_embeddings())
-            else:
-                raise ValueError(f"Unsupported vector_store_type: {vector_store_type}")
-
-            batch_size = 20  # Smaller batch size to avoid message size limits
-            total_docs = len(documents)
-            print(f"Processing {total_docs} documents in batches of {batch_size}")
-            for i in range(0, total_docs, batch_size):
-                batch_end = min(i + batch_size, total_docs)
-                batch = documents[i:batch_end]
-                batch_uuids = [str(uuid4()) for _ in range(len(batch))]
-                print(f"Processing batch {i//batch_size + 1}/{(total_docs + batch_size - 1)//batch_size}: documents {i+1}-{batch_end}")
-                try:
-                    if vector_store_type == "pinecone":
-                        vector_store.add_documents(documents=batch, ids=batch_uuids)
-                    else:
-                        vector_store.add_documents(documents=batch)
-                    print(f"Successfully added batch {i//batch_size + 1}")
-                except Exception as batch_error:
-                    print(f"Error processing batch {i//batch_size + 1}: {str(batch_error)}")
-
-                    # If the batch is still too large, try with an even smaller batch
-                    if "message length too large" in str(batch_error):
-                        smaller_batch_size = max(5, batch_size // 4)  # Even smaller batch size
-                        print(f"Trying with smaller batch size: {smaller_batch_size}")
-
-                        for j in range(i, batch_end, smaller_batch_size):
-                            smaller_batch_end = min(j + smaller_batch_size, batch_end)
-                            smaller_batch = documents[j:smaller_batch_end]
-                            smaller_batch_uuids = [str(uuid4()) for _ in range(len(smaller_batch))]
-
-                            try:
-                                vector_store.add_documents(documents=smaller_batch, ids=smaller_batch_uuids)
-                                print(f"Successfully added smaller batch {j}-{smaller_batch_end}")
-                            except Exception as smaller_batch_error:
-                                print(f"Error processing smaller batch {j}-{smaller_batch_end}: {str(smaller_batch_error)}")
-
-                                # If even the smaller batch fails, try one by one
-                                if "message length too large" in str(smaller_batch_error):
-                                    print("Batch still too large, processing documents individually")
-                                    for k, doc in enumerate(smaller_batch):
-                                        try:
-                                            # Try to reduce document size if it's too large
-                                            if len(doc.page_content) > 2000:
-                                                doc.page_content = doc.page_content[:2000] + "... (content truncated)"
-
-                                            single_uuid = str(uuid4())
-                                            vector_store.add_documents(documents=[doc], ids=[single_uuid])
-                                            print(f"Added document {j+k+1}/{batch_end}")
-                                        except Exception as single_doc_error:
-                                            print(f"Error with document {j+k+1}: {str(single_doc_error)}")
-                                            # Skip this document and continue
-                                            continue
-
-            print("Completed processing all document batches")
+            vector_store = get_vector_store(
+                vector_store_type, self.model_loader.load_embeddings(), self.config, create_index=True
+            )
+
+            # Jobs sharing the manifest run this section one at a time: each diffs against and
+            # saves the whole file, and a concurrent job's save would drop the other's sources
+            manifest_path = self.config["vector_db"].get("manifest_path", "chroma_db/manifest.json")
+            with _manifest_lock(manifest_path):
+                # Content-addressed IDs: re-uploading a file only writes the chunks that changed
+                chunk_ids = assign_chunk_ids(documents)
+                manifest = IngestionManifest(manifest_path, store=vector_store_type)
+                ids_by_source = {}
+                for doc, chunk_id in zip(documents, chunk_ids):
+                    ids_by_source.setdefault(str(doc.metadata.get("source", "")), []).append(chunk_id)
+
+                pending_ids, stale_ids = manifest.plan(ids_by_source, replace=replace)
+                # Dict keyed by ID also drops duplicates when the same file is uploaded twice in one request
+                all_chunks = list({doc.metadata["chunk_id"]: doc for doc in documents}.values())
+
+                # Chunks stored before content-addressed IDs have random IDs the manifest doesn't know;
+                # the first upload of such a source removes the ones it is about to write again
+                known_sources = manifest.sources()
+                for source in ids_by_source:
+                    if source not in known_sources:
+                        legacy_ids = legacy_chunk_ids(vector_store, source, {
+                            doc.metadata["content_hash"] for doc in all_chunks
+                            if str(doc.metadata.get("source", "")) == source
+                        })
+                        if legacy_ids:
+                            print(f"Removing {len(legacy_ids)} chunks of {source} stored without content IDs")
+                            stale_ids.extend(legacy_ids)
+                documents = [doc for doc in all_chunks if doc.metadata["chunk_id"] in pending_ids]
+                progress.set("chunks_skipped", len(chunk_ids) - len(documents))
+                print(f"{len(documents)} new or changed chunks, {len(stale_ids)} stale chunks, "
+                      f"{len(chunk_ids) - len(documents)} unchanged chunks skipped")
+
+                batch_config = self.config.get("batching", {})
+                batches = plan_batches(
+                    documents,
+                    max_batch_bytes=batch_config.get("max_batch_bytes", 2_000_000),
+                    max_batch_items=batch_config.get("max_batch_items", 100),
+                    vector_bytes=batch_config.get("vector_bytes", 384 * 12),
+                )
+                writer = BatchWriter(
+                    vector_store,
+                    progress,
+                    max_retries=batch_config.get("max_retries", 3),
+                    backoff_seconds=batch_config.get("backoff_seconds", 1.0),
+                )
+                print(f"Processing {len(documents)} documents in {len(batches)} batches")
+                # One persist for the whole job rather than one per batch
+                with write_session(vector_store):
+                    written_ids, failed_ids = writer.write(batches)
+
+                    if stale_ids:
+                        vector_store.delete(ids=stale_ids)
+                        print(f"Deleted {len(stale_ids)} stale chunks")
+
+                manifest.record(ids_by_source, written_ids, replace=replace)
+                manifest.save()
+
+                # Keep the BM25 index in step with the vector store (also backfills chunks stored before it existed)
+                lexical_index = get_lexical_index(lexical_index_path(self.config, vector_store_type))
+                lexical_index.remove(stale_ids)
+                lexical_index.add([
+                    doc for doc in all_chunks
+                    if doc.metadata["chunk_id"] in written_ids
+                    or (doc.metadata["chunk_id"] not in pending_ids and doc.metadata["chunk_id"] not in lexical_index)
+                ])
+                lexical_index.save()
+
+                # Exported TypeScript symbols -> defining chunk, for direct definition lookup
+                symbol_index = get_symbol_index(symbol_index_path(self.config, vector_store_type))
+                for source in ids_by_source:
+                    stored_ids = manifest.chunk_ids(source)
+                    symbol_index.index_source(source, [
+                        doc for doc in all_chunks
+                        if str(doc.metadata.get("source", "")) == source and doc.metadata["chunk_id"] in stored_ids
+                    ], replace=replace)
+                symbol_index.save()
+
+                print(f"Completed processing all document batches ({len(failed_ids)} chunks failed)")
+                if written_ids or stale_ids:
+                    # Invalidate caches keyed on the previous index contents
+                    bump_index_generation()
 
         except Exception as e:
             raise AlayticsBotException(e, sys)
 
-    def run_pipeline(self, uploaded_files, vector_store_type="chroma"):
+    def run_pipeline(self, uploaded_files, vector_store_type=None, progress=None, replace=False):
         try:
-            documents = self.load_documents(uploaded_files)
+            documents = self.load_documents(uploaded_files, progress=progress)
             if not documents:
                 print("No valid documents found.")
                 return
-            self.store_in_vector_db(documents, vector_store_type=vector_store_type)
+            self.store_in_vector_db(documents, vector_store_type=vector_store_type, progress=progress, replace=replace)
         except Exception as e:
             raise AlayticsBotException(e, sys)
 
@@ -0,0 +1,102 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from uuid import uuid4
+from data_ingestion.ingestion_pipeline import DataIngestion
+from data_ingestion.progress import IngestionProgress
+from utils.config_loader import load_config
+
+class IngestionQueueFullError(Exception):
+    pass
+
+class IngestionJob:
+    """
+    A single background ingestion run and its progress.
+    """
+    def __init__(self, files, vector_store_type=None, replace=False):
+        self.id = str(uuid4())
+        self.files = files
+        self.vector_store_type = vector_store_type
+        self.replace = replace
+        self.status = "queued"
+        self.error = None
+        self.progress = IngestionProgress()
+        self.progress.set("files_total", len(files))
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "error": self.error,
+            "progress": self.progress.to_dict(),
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+class IngestionJobManager:
+    """
+    Runs ingestion jobs on a bounded worker pool so uploads never block the event loop.
+    Keeps the most recent `max_jobs` jobs for status lookups.
+    """
+    def __init__(self, max_workers=2, max_pending=20, max_jobs=200):
+        self.max_pending = max_pending
+        self.max_jobs = max_jobs
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingestion")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, files, vector_store_type=None, replace=False):
+        """
+        Queue an ingestion job and return it immediately. Without `vector_store_type`,
+        the job writes to the store configured under `vector_db.type`. With `replace`, the
+        uploads replace the stored sources of the same name (see DataIngestion.store_in_vector_db).
+        Raises IngestionQueueFullError when `max_pending` jobs are already queued or running.
+        """
+        with self._lock:
+            pending = sum(1 for job in self._jobs.values() if job.status in ("queued", "running"))
+            if pending >= self.max_pending:
+                raise IngestionQueueFullError(f"Too many ingestion jobs in progress ({pending}), try again later")
+            job = IngestionJob(files, vector_store_type=vector_store_type, replace=replace)
+            self._jobs[job.id] = job
+            self._evict_finished()
+        self._executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _evict_finished(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.status in ("completed", "failed")]
+        for job_id in finished[:max(0, len(self._jobs) - self.max_jobs)]:
+            del self._jobs[job_id]
+
+    def _run(self, job):
+        job.status = "running"
+        job.started_at = time.time()
+        try:
+            ingestion = DataIngestion()
+            ingestion.run_pipeline(
+                job.files, vector_store_type=job.vector_store_type, progress=job.progress, replace=job.replace
+            )
+            job.status = "completed"
+        except Exception as e:
+            job.error = str(e)
+            job.progress.add_error(e)
+            job.status = "failed"
+        finally:
+            for staged_file in job.files:
+                staged_file.cleanup()
+            job.files = None
+            job.finished_at = time.time()
+
+_ingestion_config = load_config().get("ingestion", {})
+ingestion_jobs = IngestionJobManager(
+    max_workers=_ingestion_config.get("max_workers", 2),
+    max_pending=_ingestion_config.get("max_pending_jobs", 20),
+)
@@ -0,0 +1,54 @@
+# Parsing functions run in worker processes by DataIngestion.load_documents, so they must stay top-level and picklable
+from langchain_core.documents import Document
+from langchain_community.document_loaders import Docx2txtLoader
+from pypdf import PdfReader
+from utils.csv_processor import process_csv_for_vector_db, examine_csv_file
+
+def pdf_page_count(path):
+    return len(PdfReader(path).pages)
+
+def parse_pdf_pages(path, filename, start, end):
+    """
+    Extract pages [start, end) of a PDF, one document per page (same metadata as PyPDFLoader).
+    """
+    reader = PdfReader(path)
+    total_pages = len(reader.pages)
+    return [
+        Document(
+            page_content=reader.pages[page].extract_text() or "",
+            metadata={"source": filename, "page": page, "total_pages": total_pages},
+        )
+        for page in range(start, min(end, total_pages))
+    ]
+
+def parse_docx(path, filename):
+    documents = Docx2txtLoader(path).load()
+    for doc in documents:
+        doc.metadata["source"] = filename
+    return documents
+
+def parse_csv(path, filename):
+    # First, examine the CSV file to help with debugging
+    print(f"Examining CSV file: {filename}")
+    examine_csv_file(path)
+
+    # Use our custom CSV processor for better handling of structured data
+    print(f"Processing CSV file with custom processor: {filename}")
+    csv_docs = process_csv_for_vector_db(path)
+
+    # Add additional processing for better retrieval
+    for doc in csv_docs:
+        # Add filename to metadata
+        doc.metadata["source"] = filename
+
+        # Add a special section for common queries about user IDs and event types
+        if "userid" in doc.metadata and "eventtype" in doc.metadata:
+            doc.page_content += f"\n\nThis record contains user ID {doc.metadata['userid']} with event type {doc.metadata['eventtype']}."
+
+    print(f"Processed {len(csv_docs)} rows from CSV file")
+    return csv_docs
+
+PARSERS = {
+    ".docx": parse_docx,
+    ".csv": parse_csv,
+}
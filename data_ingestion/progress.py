@@ -0,0 +1,34 @@
+import threading
+
+class IngestionProgress:
+    """
+    Thread-safe progress counters for one ingestion run.
+    """
+    COUNTERS = ("files_total", "files_parsed", "chunks_total", "chunks_embedded", "chunks_skipped", "batches_upserted")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {name: 0 for name in self.COUNTERS}
+        self.errors = []
+        self.failed_chunks = []
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def set(self, name, value):
+        with self._lock:
+            self.counters[name] = value
+
+    def add_error(self, message):
+        print(f"Ingestion error: {message}")
+        with self._lock:
+            self.errors.append(str(message))
+
+    def add_failed(self, chunk_ids):
+        with self._lock:
+            self.failed_chunks.extend(chunk_ids)
+
+    def to_dict(self):
+        with self._lock:
+            return {**self.counters, "errors": list(self.errors), "failed_chunks": list(self.failed_chunks)}
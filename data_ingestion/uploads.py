@@ -0,0 +1,135 @@
+import json
+import os
+import tempfile
+
+# Small text formats are decoded straight from the spooled upload, everything else is copied to a temp file
+TEXT_EXTENSIONS = {".txt", ".ts", ".tsx"}
+
+class UploadTooLargeError(Exception):
+    pass
+
+class RequestSizeLimitMiddleware:
+    """
+    ASGI middleware answering 413 for request bodies over `max_bytes` on `paths`, before the
+    multipart form is parsed and spooled to disk: on the Content-Length header when there is one,
+    otherwise by counting the body as it streams in.
+    """
+    def __init__(self, app, max_bytes, paths=("/upload",)):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.paths = set(paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+        error = f"Upload exceeds the {self.max_bytes} byte request limit"
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > self.max_bytes:
+            await self._reject(send, error)
+            return
+
+        received = 0
+        exceeded = False
+        response_started = False
+
+        async def limited_receive():
+            nonlocal received, exceeded
+            if exceeded:
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # Stop reading; the app's (failed) response is replaced by the 413 below
+                    exceeded = True
+                    return {"type": "http.disconnect"}
+            return message
+
+        async def checked_send(message):
+            nonlocal response_started
+            if not exceeded:
+                response_started = True
+                await send(message)
+
+        try:
+            await self.app(scope, limited_receive, checked_send)
+        except Exception:
+            if not exceeded:
+                raise
+        if exceeded and not response_started:
+            await self._reject(send, error)
+
+    async def _reject(self, send, error):
+        body = json.dumps({"error": error}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+class StagedUpload:
+    """
+    An uploaded file captured from the request so it can be ingested after the request returns.
+
+    Text formats carry their decoded `text`; other formats are streamed to a temp file at `path`,
+    which is removed by `cleanup()` once the ingestion job finishes.
+    """
+    def __init__(self, filename, path=None, text=None):
+        self.filename = filename
+        self.path = path
+        self.text = text
+
+    @property
+    def extension(self):
+        return os.path.splitext(self.filename)[1].lower()
+
+    def cleanup(self):
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+        self.path = None
+
+async def stage_uploads(files, max_file_bytes=25 * 1024 * 1024, max_request_bytes=100 * 1024 * 1024, chunk_bytes=1024 * 1024):
+    """
+    Copy the request's UploadFiles in fixed-size chunks, enforcing per-file and per-request size limits.
+    Raises UploadTooLargeError (after removing anything already staged) when a limit is exceeded.
+    """
+    staged = []
+    request_bytes = 0
+    try:
+        for upload in files:
+            ext = os.path.splitext(upload.filename)[1].lower()
+            file_bytes = 0
+            if ext in TEXT_EXTENSIONS:
+                parts = []
+                sink = parts.append
+                temp_file = None
+            else:
+                temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=ext or ".tmp")
+                staged.append(StagedUpload(upload.filename, path=temp_file.name))
+                sink = temp_file.write
+
+            try:
+                while True:
+                    chunk = await upload.read(chunk_bytes)
+                    if not chunk:
+                        break
+                    file_bytes += len(chunk)
+                    request_bytes += len(chunk)
+                    if file_bytes > max_file_bytes:
+                        raise UploadTooLargeError(f"{upload.filename} exceeds the {max_file_bytes} byte file limit")
+                    if request_bytes > max_request_bytes:
+                        raise UploadTooLargeError(f"Upload exceeds the {max_request_bytes} byte request limit")
+                    sink(chunk)
+            finally:
+                if temp_file is not None:
+                    temp_file.close()
+
+            if temp_file is None:
+                staged.append(StagedUpload(upload.filename, text=b"".join(parts).decode("utf-8", errors="replace")))
+        return staged
+    except Exception:
+        for upload in staged:
+            upload.cleanup()
+        raise
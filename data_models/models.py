@@ -1,7 +1,14 @@
 from pydantic import BaseModel
 from langgraph.graph.message import add_messages
-from typing import Annotated, TypedDict
+from langgraph.prebuilt import InjectedState
+from langchain_core.tools import InjectedToolCallId
+from typing import Annotated, Optional, TypedDict
 class RagToolSchema(BaseModel):
     question:str 
+    # Filled in by the ToolNode, hidden from the LLM
+    state: Annotated[dict, InjectedState]
+    tool_call_id: Annotated[str, InjectedToolCallId]
 class QuestionRequest(BaseModel):
-    question: str
\ No newline at end of file
+    question: str
+    # Continue a conversation: follow-ups reuse its messages, retrieved context and generated files
+    session_id: Optional[str] = None
\ No newline at end of file
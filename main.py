@@ -1,12 +1,32 @@
+import asyncio
+import json
 from fastapi import FastAPI, UploadFile, File, Request
 from fastapi.middleware.cors import CORSMiddleware
 from typing import List
-from starlette.responses import JSONResponse
-from data_ingestion.ingestion_pipeline import DataIngestion  # you already have this
-from agent.workflow import GraphBuilder  # this should be your graph stream handler
+from starlette.responses import JSONResponse, StreamingResponse
+from data_ingestion.job_queue import ingestion_jobs, IngestionQueueFullError
+from data_ingestion.uploads import stage_uploads, RequestSizeLimitMiddleware, UploadTooLargeError
+from utils.config_loader import load_config
+from agent.graph_registry import graph_registry
+from agent.sessions import create_checkpointer
+from agent.workflow import file_sections
+from langchain_core.messages import AIMessage, HumanMessage
+from utils.semantic_cache import SemanticCache
+from toolkit.tools import model_loader, retrieval_cache
+from utils.model_loaders import llm_router_stats
+from utils.llm_router import HEDGE_TAG
 from data_models.models import *
 
 app = FastAPI()
+config = load_config()
+upload_config = config.get("uploads", {})
+
+response_cache_config = config.get("response_cache", {})
+response_cache = SemanticCache(
+    max_entries=response_cache_config.get("max_entries", 256),
+    ttl_seconds=response_cache_config.get("ttl_seconds", 1800),
+    similarity_threshold=response_cache_config.get("similarity_threshold", 0.97),
+) if response_cache_config.get("enabled", True) else None
 
 app.add_middleware(
     CORSMiddleware,
@@ -15,29 +35,139 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Oversized uploads are refused before Starlette spools the multipart body to disk
+app.add_middleware(RequestSizeLimitMiddleware, max_bytes=upload_config.get("max_request_mb", 100) * 1024 * 1024)
+
+# "router" spreads calls over every configured provider with hedging and fallback
+DEFAULT_PROVIDER = config.get("llm", {}).get("default_provider", "google")
+
+@app.on_event("startup")
+def warm_graphs():
+    # Build and compile the graph once so requests don't pay for it
+    graph_registry.warm(providers=[DEFAULT_PROVIDER])
 
 @app.post("/upload")
-async def upload_files(files: List[UploadFile] = File(...)):
+async def upload_files(files: List[UploadFile] = File(...), replace: bool = False):
+    """
+    Queue uploaded files for ingestion. By default chunks are only added; `?replace=true` makes
+    each file replace the stored file of the same name, deleting the chunks it no longer has.
+    """
     try:
-        ingestion = DataIngestion()
-        ingestion.run_pipeline(files)
-        return {"message": "Files successfully processed and stored."}
+        staged_files = await stage_uploads(
+            files,
+            max_file_bytes=upload_config.get("max_file_mb", 25) * 1024 * 1024,
+            max_request_bytes=upload_config.get("max_request_mb", 100) * 1024 * 1024,
+            chunk_bytes=upload_config.get("chunk_kb", 1024) * 1024,
+        )
+        try:
+            job = ingestion_jobs.submit(staged_files, replace=replace)
+        except Exception:
+            for staged_file in staged_files:
+                staged_file.cleanup()
+            raise
+        return JSONResponse(
+            status_code=202,
+            content={"message": "Files accepted for processing.", "job_id": job.id, "status": job.status},
+        )
+    except UploadTooLargeError as e:
+        return JSONResponse(status_code=413, content={"error": str(e)})
+    except IngestionQueueFullError as e:
+        return JSONResponse(status_code=429, content={"error": str(e)})
     except Exception as e:
         return JSONResponse(status_code=500, content={"error": str(e)})
 
 
+session_config = config.get("sessions", {})
+# Conversation sessions: requests with a session_id continue that thread's checkpointed state
+session_checkpointer = (
+    create_checkpointer(
+        session_config.get("path", "sessions/checkpoints.sqlite"),
+        idle_ttl_seconds=session_config.get("idle_ttl_hours", 72) * 3600,
+        expire_interval_seconds=session_config.get("expire_interval_minutes", 10) * 60,
+    )
+    if session_config.get("enabled", True) else None
+)
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = ingestion_jobs.get(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"error": f"Unknown job: {job_id}"})
+    return job.to_dict()
+
+
+def _graph_run(request):
+    """
+    Return (graph, run config) for a query: a checkpointed session run when it carries a session_id.
+    """
+    if request.session_id and session_checkpointer is not None:
+        graph = graph_registry.get(DEFAULT_PROVIDER, checkpointer=session_checkpointer)
+        return graph, {"configurable": {"thread_id": request.session_id}}
+    return graph_registry.get(DEFAULT_PROVIDER), None
+
+def _bypass_response_cache(http_request):
+    # Clients skip the cached answer with "X-Cache-Bypass: 1" or "Cache-Control: no-cache"
+    bypass = http_request.headers.get("x-cache-bypass", "").lower() in ("1", "true", "yes")
+    return bypass or "no-cache" in http_request.headers.get("cache-control", "").lower()
+
+def _is_session_start(graph, run_config):
+    """
+    Whether a run starts with no conversation behind it: always outside a session,
+    and on a session's first turn. Only those answers may come from or go to the response cache.
+    """
+    return run_config is None or graph.checkpointer.get_tuple(run_config) is None
+
+def _session_turn_update(question, answer):
+    # What a generated first turn would have left in the session, so follow-ups can refine a cached answer
+    return {
+        "messages": [HumanMessage(content=question), AIMessage(content=answer)],
+        "context_question": question,
+        "journey_files": file_sections(answer),
+    }
+
+def _cached_answer(question, http_request, cacheable=True):
+    """
+    Look the question up in the response cache. Returns (answer or None, question embedding).
+    """
+    if response_cache is None or not cacheable or _bypass_response_cache(http_request):
+        return None, None
+    embeddings = model_loader.load_embeddings()
+    return response_cache.lookup(question, namespace=DEFAULT_PROVIDER, embed=lambda: embeddings.embed_query(question))
+
+def _complete(result):
+    # Answers missing planned files (a provider error mid fan-out) must not be replayed from the cache
+    return not (isinstance(result, dict) and result.get("failed_files"))
+
+def _cache_answer(question, answer, embedding, cacheable=True):
+    if response_cache is not None and cacheable:
+        if embedding is None:
+            embedding = model_loader.load_embeddings().embed_query(question)
+        response_cache.store(question, answer, namespace=DEFAULT_PROVIDER, embedding=embedding)
+
 @app.post("/query")
-async def query_chatbot(request: QuestionRequest):
+async def query_chatbot(request: QuestionRequest, http_request: Request):
     try:
-        # Use GROQ instead of Google Gemini to avoid rate limits
-        graph_service = GraphBuilder(provider="google")
-        graph_service.build()
-        graph = graph_service.get_graph()
+        graph, run_config = _graph_run(request)
+        cacheable = _is_session_start(graph, run_config)
+        # Embedding the question and the SQLite lookup run off the event loop
+        cached_answer, question_embedding = await asyncio.to_thread(
+            _cached_answer, request.question, http_request, cacheable
+        )
+        if cached_answer is not None:
+            if run_config is not None:
+                graph.update_state(run_config, _session_turn_update(request.question, cached_answer), as_node="chatbot")
+                session_checkpointer.end_turn(request.session_id)
+            return {"answer": cached_answer, "cached": True, "session_id": request.session_id}
 
         # Assuming request is a pydantic object like: {"question": "your text"}
+        # In a session the question is appended to the thread's checkpointed messages
         messages={"messages": [request.question]}
 
-        result = graph.invoke(messages)
+        try:
+            result = graph.invoke(messages, config=run_config)
+        finally:
+            if run_config is not None:
+                session_checkpointer.end_turn(request.session_id)
 
         # If result is dict with messages:
         if isinstance(result, dict) and "messages" in result:
@@ -45,6 +175,106 @@ async def query_chatbot(request: QuestionRequest):
         else:
             final_output = str(result)
 
-        return {"answer": final_output}
+        await asyncio.to_thread(
+            _cache_answer, request.question, final_output, question_embedding, cacheable and _complete(result)
+        )
+        return {"answer": final_output, "session_id": request.session_id}
     except Exception as e:
-        return JSONResponse(status_code=500, content={"error": str(e)})
\ No newline at end of file
+        return JSONResponse(status_code=500, content={"error": str(e)})
+
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def _message_text(content):
+    if isinstance(content, list):
+        return "".join(item if isinstance(item, str) else item.get("text", "") for item in content)
+    return content or ""
+
+@app.post("/query/stream")
+async def query_chatbot_stream(request: QuestionRequest, http_request: Request):
+    """
+    Stream journey generation as Server-Sent Events.
+
+    Events: node_start / node_end (graph nodes), retrieval_done / rerank_done (tool progress),
+    token (generation tokens), answer (final post-processed answer) and error.
+    """
+    graph, run_config = _graph_run(request)
+    messages = {"messages": [request.question]}
+
+    async def event_stream():
+        try:
+            cacheable = await asyncio.to_thread(_is_session_start, graph, run_config)
+            cached_answer, question_embedding = await asyncio.to_thread(
+                _cached_answer, request.question, http_request, cacheable
+            )
+            if cached_answer is not None:
+                if run_config is not None:
+                    await graph.aupdate_state(
+                        run_config, _session_turn_update(request.question, cached_answer), as_node="chatbot"
+                    )
+                    await session_checkpointer.aend_turn(request.session_id)
+                yield _sse("answer", {"answer": cached_answer, "cached": True})
+                return
+            async for event in graph.astream_events(messages, config=run_config, version="v2"):
+                kind = event["event"]
+                node = event.get("metadata", {}).get("langgraph_node")
+                if kind == "on_custom_event":
+                    yield _sse(event["name"], event["data"])
+                elif kind == "on_chat_model_stream" and HEDGE_TAG not in event.get("tags", []):
+                    text = _message_text(event["data"]["chunk"].content)
+                    if text:
+                        yield _sse("token", {"text": text, "node": node})
+                elif kind in ("on_chain_start", "on_chain_end") and node and event["name"] == node:
+                    yield _sse("node_start" if kind == "on_chain_start" else "node_end", {"node": node})
+                elif kind == "on_chain_end" and not event.get("parent_ids"):
+                    result = event["data"].get("output")
+                    if isinstance(result, dict) and "messages" in result:
+                        final_output = _message_text(result["messages"][-1].content)
+                    else:
+                        final_output = str(result)
+                    await asyncio.to_thread(
+                        _cache_answer, request.question, final_output, question_embedding, cacheable and _complete(result)
+                    )
+                    yield _sse("answer", {"answer": final_output})
+            if run_config is not None:
+                # A failed turn is pruned by the session's next successful one
+                await session_checkpointer.aend_turn(request.session_id)
+        except Exception as e:
+            yield _sse("error", {"error": str(e)})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.delete("/sessions/{session_id}")
+async def delete_session(session_id: str):
+    if session_checkpointer is None:
+        return JSONResponse(status_code=404, content={"error": "Sessions are disabled"})
+    session_checkpointer.delete_thread(session_id)
+    return {"message": f"Session {session_id} deleted."}
+
+
+@app.post("/graph/reload")
+async def reload_graph(provider: str = None):
+    try:
+        rebuilt = graph_registry.rebuild(provider)
+        return {"message": "Graph rebuilt.", "providers": rebuilt}
+    except Exception as e:
+        return JSONResponse(status_code=500, content={"error": str(e)})
+
+
+@app.get("/llm/stats")
+async def llm_stats():
+    return {"provider": DEFAULT_PROVIDER, "router": llm_router_stats()}
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return {
+        "response_cache": response_cache.stats() if response_cache is not None else None,
+        "retrieval_cache": retrieval_cache.stats(),
+    }
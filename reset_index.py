@@ -1,30 +1,67 @@
 import os
+import shutil
+import sys
 from dotenv import load_dotenv
-from pinecone import Pinecone
 from utils.config_loader import load_config
+from utils.index_generation import bump_index_generation
+from utils.ingestion_manifest import IngestionManifest
+from utils.lexical_index import lexical_index_path
+from utils.symbol_index import symbol_index_path
+from utils.vector_stores import VECTOR_STORE_TYPES, configured_vector_store_type
 
 # Load environment variables and config
 load_dotenv()
 config = load_config()
 
-# Get Pinecone API key
-pinecone_api_key = os.getenv("PINECONE_API_KEY")
-if not pinecone_api_key:
-    print("Error: PINECONE_API_KEY not found in environment variables")
+# Store to reset: the first argument, or vector_db.type
+vector_store_type = sys.argv[1] if len(sys.argv) > 1 else configured_vector_store_type(config)
+if vector_store_type not in VECTOR_STORE_TYPES:
+    print(f"Error: unknown store {vector_store_type}, expected one of {VECTOR_STORE_TYPES}")
     exit(1)
 
-# Initialize Pinecone client
-pc = Pinecone(api_key=pinecone_api_key)
+if vector_store_type == "pinecone":
+    from pinecone import Pinecone
 
-# Get index name from config
-index_name = config["vector_db"]["index_name"]
+    # Get Pinecone API key
+    pinecone_api_key = os.getenv("PINECONE_API_KEY")
+    if not pinecone_api_key:
+        print("Error: PINECONE_API_KEY not found in environment variables")
+        exit(1)
 
-# Check if index exists
-if pc.has_index(index_name):
-    print(f"Deleting index: {index_name}")
-    pc.delete_index(index_name)
-    print(f"Index {index_name} deleted successfully")
+    # Initialize Pinecone client
+    pc = Pinecone(api_key=pinecone_api_key)
+
+    # Get index name from config
+    index_name = config["vector_db"]["index_name"]
+
+    # Check if index exists
+    if pc.has_index(index_name):
+        print(f"Deleting index: {index_name}")
+        pc.delete_index(index_name)
+        print(f"Index {index_name} deleted successfully")
+    else:
+        print(f"Index {index_name} does not exist")
+elif vector_store_type == "chroma":
+    from langchain_community.vectorstores import Chroma
+
+    chroma_config = config["vector_db"].get("chroma", {})
+    collection_name = chroma_config.get("collection_name", "langchain")
+    # Drop only the collection: the persist directory also holds the manifest and other stores' indexes
+    Chroma(collection_name=collection_name, persist_directory=chroma_config.get("persist_directory", "chroma_db")).delete_collection()
+    print(f"Chroma collection {collection_name} deleted")
 else:
-    print(f"Index {index_name} does not exist")
+    persist_directory = config["vector_db"].get("numpy", {}).get("persist_directory", "numpy_index")
+    shutil.rmtree(persist_directory, ignore_errors=True)
+    print(f"NumPy index {persist_directory} deleted")
+
+# Without this the re-upload would find every chunk "unchanged" in the manifest and write nothing
+manifest = IngestionManifest(config["vector_db"].get("manifest_path", "chroma_db/manifest.json"), store=vector_store_type)
+manifest.drop_store()
+manifest.save()
+for path in (lexical_index_path(config, vector_store_type), symbol_index_path(config, vector_store_type)):
+    if os.path.exists(path):
+        os.remove(path)
+        print(f"Removed {path}")
+bump_index_generation()
 
-print("Done. You can now re-upload your CSV file to create a new index with improved processing.")
+print("Done. Restart the API server, then re-upload your files to rebuild the index.")
@@ -6,6 +6,7 @@ import time
 import html
 import io
 import zipfile
+import uuid
 
 BASE_URL = "http://127.0.0.1:8000"  # Backend endpoint
 
@@ -36,10 +37,91 @@ This tool helps you manage and create insurance journeys using Retrieval-Augment
 - "Generate a journey for a new insurance product launch."
 """)
 
+STREAM_STATUS = {
+    "retrieval_done": "🔎 Retrieved {documents} context documents",
+    "rerank_done": "📊 Reranked {documents} documents",
+    "context_packed": "🧩 Packed {included} chunks into {tokens} tokens",
+    "completeness_checked": "🧾 Checked {files} generated files",
+    "plan_ready": "🗺️ Planned {files} files",
+    "file_generated": "📄 Generated {filename}",
+}
+
+def stream_answer(question):
+    """
+    Call the /query/stream SSE endpoint and render progress and tokens as they arrive.
+    Returns the final answer.
+    """
+    status_placeholder = st.empty()
+    token_placeholder = st.empty()
+    tokens = []
+    answer = None
+    status_placeholder.info("⏳ Bot is thinking...")
+    with requests.post(f"{BASE_URL}/query/stream", json={"question": question, "session_id": st.session_state.session_id}, stream=True) as response:
+        if response.status_code != 200:
+            raise RuntimeError(response.text)
+        event_name = None
+        for line in response.iter_lines(decode_unicode=True):
+            if not line:
+                continue
+            if line.startswith("event:"):
+                event_name = line[len("event:"):].strip()
+                continue
+            if not line.startswith("data:"):
+                continue
+            data = json.loads(line[len("data:"):].strip())
+            if event_name == "token":
+                if data.get("node") not in (None, "chatbot"):
+                    # Planner output and parallel per-file generations would interleave
+                    continue
+                tokens.append(data.get("text", ""))
+                token_placeholder.markdown("".join(tokens))
+            elif event_name in STREAM_STATUS:
+                status_placeholder.info(STREAM_STATUS[event_name].format(**data))
+            elif event_name == "node_start":
+                status_placeholder.info(f"⚙️ Running {data.get('node')}...")
+            elif event_name == "answer":
+                answer = data.get("answer")
+            elif event_name == "error":
+                raise RuntimeError(data.get("error"))
+    status_placeholder.empty()
+    token_placeholder.empty()
+    return answer if answer is not None else "".join(tokens) or "No answer returned."
+
+def wait_for_ingestion_job(job_id, poll_interval=0.5):
+    """
+    Poll /jobs/{job_id} and show real ingestion progress until the job finishes.
+    Returns the final job status.
+    """
+    progress_bar = st.progress(0)
+    status_text = st.empty()
+    while True:
+        job = requests.get(f"{BASE_URL}/jobs/{job_id}").json()
+        progress = job["progress"]
+        files_done = progress["files_parsed"] / max(progress["files_total"], 1)
+        chunks_done = (
+            (progress["chunks_embedded"] + progress["chunks_skipped"]) / progress["chunks_total"]
+            if progress["chunks_total"] else 0
+        )
+        progress_bar.progress(min(1.0, 0.3 * files_done + 0.7 * chunks_done))
+        status_text.caption(
+            f"{job['status']}: {progress['files_parsed']}/{progress['files_total']} files parsed, "
+            f"{progress['chunks_embedded']}/{progress['chunks_total']} chunks embedded "
+            f"({progress['chunks_skipped']} unchanged), "
+            f"{progress['batches_upserted']} batches upserted, {len(progress['errors'])} errors"
+        )
+        if job["status"] in ("completed", "failed"):
+            if job["status"] == "completed":
+                progress_bar.progress(1.0)
+            return job
+        time.sleep(poll_interval)
+
 # Initialize session state
 for key in ["index_status", "last_upload_time", "messages", "selected_example_query"]:
     if key not in st.session_state:
         st.session_state[key] = None if key != "messages" else []
+# One backend conversation per browser session, so follow-ups refine the previous answer
+if "session_id" not in st.session_state:
+    st.session_state.session_id = str(uuid.uuid4())
 
 # Sidebar
 with st.sidebar:
@@ -62,6 +144,12 @@ with st.sidebar:
                 except Exception as e:
                     st.error(f"Could not preview file: {str(e)}")
 
+    replace_files = st.checkbox(
+        "Replace earlier uploads with the same file names",
+        help="Deletes the stored chunks of a same-named file that the new version no longer has. "
+             "Leave off when uploading different files that share a name, such as index.ts.",
+    )
+
     if st.button("Upload and Process Data"):
         if uploaded_files:
             files = []
@@ -72,14 +160,10 @@ with st.sidebar:
 
             if files:
                 try:
-                    with st.spinner("Uploading and processing files..."):
-                        progress_bar = st.progress(0)
-                        for i in range(100):
-                            time.sleep(0.01)
-                            progress_bar.progress(i + 1)
-
-                        response = requests.post(f"{BASE_URL}/upload", files=files)
-                        if response.status_code == 200:
+                    response = requests.post(f"{BASE_URL}/upload", files=files, params={"replace": replace_files})
+                    if response.status_code == 202:
+                        job = wait_for_ingestion_job(response.json()["job_id"])
+                        if job["status"] == "completed":
                             st.success("✅ Files uploaded and processed successfully!")
                             st.session_state.index_status = "ready"
                             st.session_state.last_upload_time = time.time()
@@ -90,7 +174,11 @@ with st.sidebar:
                                     "content": "I've processed your data files. You can now ask questions about the data."
                                 })
                         else:
-                            st.error("❌ Upload failed: " + response.text)
+                            st.error("❌ Processing failed: " + str(job.get("error")))
+                        for error in job["progress"]["errors"]:
+                            st.warning(error)
+                    else:
+                        st.error("❌ Upload failed: " + response.text)
                 except Exception as e:
                     st.error(f"Error: {str(e)}")
 
@@ -114,14 +202,10 @@ if st.session_state.selected_example_query:
     st.session_state.selected_example_query = None
     st.session_state.messages.append({"role": "user", "content": query})
     try:
-        with st.spinner("Bot is thinking..."):
-            payload = {"question": query}
-            response = requests.post(f"{BASE_URL}/query", json=payload)
-        if response.status_code == 200:
-            answer = response.json().get("answer", "No answer returned.")
-            st.session_state.messages.append({"role": "bot", "content": answer})
-        else:
-            st.error("❌ Bot failed to respond: " + response.text)
+        answer = stream_answer(query)
+        st.session_state.messages.append({"role": "bot", "content": answer})
+    except RuntimeError as e:
+        st.error("❌ Bot failed to respond: " + str(e))
     except Exception as e:
         st.error(f"Error: {str(e)}")
     st.rerun()
@@ -304,6 +388,12 @@ with col1:
 
     if clear_button:
         st.session_state.messages = []
+        # Start a fresh backend conversation as well, dropping the old one's stored state
+        try:
+            requests.delete(f"{BASE_URL}/sessions/{st.session_state.session_id}", timeout=5)
+        except requests.RequestException:
+            pass
+        st.session_state.session_id = str(uuid.uuid4())
         st.rerun()
 
     if submit_button and user_input.strip():
@@ -318,21 +408,17 @@ if (
     last_msg = st.session_state.messages[-1]
     last_msg["processing"] = True
     try:
-        with st.spinner("Bot is thinking..."):
-            payload = {"question": last_msg["content"]}
-            response = requests.post(f"{BASE_URL}/query", json=payload)
-        if response.status_code == 200:
-            answer = response.json().get("answer", "No answer returned.")
-            if isinstance(answer, str):
-                if answer.strip().startswith('{') and answer.strip().endswith('}'):
-                    try:
-                        json_data = json.loads(answer)
-                        answer = f"```json\n{json.dumps(json_data, indent=2)}\n```"
-                    except:
-                        pass
-            st.session_state.messages.append({"role": "bot", "content": answer})
-        else:
-            st.error("❌ Bot failed to respond: " + response.text)
+        answer = stream_answer(last_msg["content"])
+        if isinstance(answer, str):
+            if answer.strip().startswith('{') and answer.strip().endswith('}'):
+                try:
+                    json_data = json.loads(answer)
+                    answer = f"```json\n{json.dumps(json_data, indent=2)}\n```"
+                except:
+                    pass
+        st.session_state.messages.append({"role": "bot", "content": answer})
+    except RuntimeError as e:
+        st.error("❌ Bot failed to respond: " + str(e))
     except Exception as e:
         st.error(f"Error: {str(e)}")
     del last_msg["processing"]
@@ -0,0 +1,65 @@
+from langchain_core.documents import Document
+from utils.ingestion_manifest import IngestionManifest, assign_chunk_ids
+from utils.symbol_index import SymbolIndex
+
+OWNERSHIP = "export const ownershipJourney = buildJourney('ownership');"
+BENEFICIARY = "export const beneficiaryJourney = buildJourney('beneficiary');"
+
+def upload(manifest, symbol_index, text, written, replace=False):
+    """
+    The manifest and symbol index bookkeeping of DataIngestion.store_in_vector_db for one file.
+    """
+    chunks = [Document(page_content=text, metadata={"source": "index.ts"})]
+    ids = assign_chunk_ids(chunks)
+    ids_by_source = {"index.ts": ids}
+    pending_ids, stale_ids = manifest.plan(ids_by_source, replace=replace)
+    written.update(pending_ids)
+    written.difference_update(stale_ids)
+    manifest.record(ids_by_source, pending_ids, replace=replace)
+    stored_ids = manifest.chunk_ids("index.ts")
+    symbol_index.index_source("index.ts", [c for c in chunks if c.metadata["chunk_id"] in stored_ids], replace=replace)
+    return pending_ids, stale_ids
+
+def test_same_basename_upload_keeps_earlier_file(tmp_path):
+    manifest = IngestionManifest(str(tmp_path / "manifest.json"))
+    symbol_index = SymbolIndex(str(tmp_path / "symbols.json"))
+    written = set()
+    upload(manifest, symbol_index, OWNERSHIP, written)
+    pending_ids, stale_ids = upload(manifest, symbol_index, BENEFICIARY, written)
+
+    assert len(pending_ids) == 1
+    assert stale_ids == []
+    assert len(written) == 2
+    assert len(manifest.chunk_ids("index.ts")) == 2
+    assert symbol_index.find_symbols("ownershipJourney beneficiaryJourney") == ["ownershipJourney", "beneficiaryJourney"]
+
+def test_unchanged_upload_writes_nothing(tmp_path):
+    manifest = IngestionManifest(str(tmp_path / "manifest.json"))
+    symbol_index = SymbolIndex(str(tmp_path / "symbols.json"))
+    written = set()
+    upload(manifest, symbol_index, OWNERSHIP, written)
+    assert upload(manifest, symbol_index, OWNERSHIP, written) == (set(), [])
+
+def test_replace_deletes_chunks_of_previous_version(tmp_path):
+    manifest = IngestionManifest(str(tmp_path / "manifest.json"))
+    symbol_index = SymbolIndex(str(tmp_path / "symbols.json"))
+    written = set()
+    upload(manifest, symbol_index, OWNERSHIP, written)
+    _, stale_ids = upload(manifest, symbol_index, BENEFICIARY, written, replace=True)
+
+    assert len(stale_ids) == 1
+    assert len(written) == 1
+    assert len(manifest.chunk_ids("index.ts")) == 1
+    assert symbol_index.find_symbols("ownershipJourney beneficiaryJourney") == ["beneficiaryJourney"]
+
+def test_drop_store_forgets_only_that_store(tmp_path):
+    path = str(tmp_path / "manifest.json")
+    for store in ("chroma", "numpy"):
+        manifest = IngestionManifest(path, store=store)
+        manifest.record({"index.ts": ["a"]}, {"a"})
+        manifest.save()
+    manifest = IngestionManifest(path, store="chroma")
+    manifest.drop_store()
+    manifest.save()
+    assert IngestionManifest(path, store="chroma").sources() == set()
+    assert IngestionManifest(path, store="numpy").sources() == {"index.ts"}
@@ -0,0 +1,89 @@
+import time
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from utils.llm_router import HEDGE_TAG, LLMRouter
+
+class DemoChatModel(FakeListChatModel):
+    delay: float = 0.0
+    fail: bool = False
+
+    def _call(self, *args, **kwargs):
+        time.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError(f"{self.responses[0]} unavailable")
+        return super()._call(*args, **kwargs)
+
+class TagRecorder(BaseCallbackHandler):
+    def __init__(self):
+        self.tags = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, tags=None, metadata=None, **kwargs):
+        self.tags[run_id] = list(tags or [])
+
+def make_router(**kwargs):
+    primary = DemoChatModel(responses=["primary"], delay=0.01)
+    secondary = DemoChatModel(responses=["secondary"], delay=0.01)
+    options = dict(initial_hedge_delay=0.2, hedge_min_delay=0.05, failure_threshold=2, cooldown_seconds=0.3)
+    options.update(kwargs)
+    return LLMRouter({"primary": primary, "secondary": secondary}, **options), primary, secondary
+
+def test_healthy_primary_answers():
+    router, _, _ = make_router()
+    assert [router.invoke("hi").content for _ in range(3)] == ["primary"] * 3
+    assert router.stats["primary"].to_dict()["calls"] == 3
+    assert router.stats["secondary"].to_dict()["calls"] == 0
+
+def test_slow_primary_is_hedged_and_hedge_is_tagged():
+    router, primary, _ = make_router()
+    primary.delay = 1.0
+    recorder = TagRecorder()
+    start = time.monotonic()
+    result = router.invoke("hi", config={"callbacks": [recorder]})
+    assert result.content == "secondary"
+    assert time.monotonic() - start < 0.8
+    # Only the hedged call is tagged, so streams can drop its tokens
+    assert sorted(HEDGE_TAG in tags for tags in recorder.tags.values()) == [False, True]
+
+def test_no_hedge_when_disabled():
+    router, primary, _ = make_router(hedge=False)
+    primary.delay = 0.3
+    assert router.invoke("hi").content == "primary"
+
+def test_failure_falls_back_and_breaker_transitions():
+    router, primary, _ = make_router()
+    primary.fail = True
+    assert [router.invoke("hi").content for _ in range(2)] == ["secondary"] * 2
+    assert router.stats["primary"].state() == "open"
+
+    # Open: the primary is skipped without a call
+    calls = router.stats["primary"].to_dict()["calls"]
+    assert router.invoke("hi").content == "secondary"
+    assert router.stats["primary"].to_dict()["calls"] == calls
+
+    time.sleep(0.35)
+    assert router.stats["primary"].state() == "half_open"
+    # A failing trial reopens the breaker
+    assert router.invoke("hi").content == "secondary"
+    assert router.stats["primary"].state() == "open"
+
+    time.sleep(0.35)
+    primary.fail = False
+    # A successful trial closes it
+    assert router.invoke("hi").content == "primary"
+    assert router.stats["primary"].state() == "closed"
+
+def test_all_providers_failing_raises():
+    router, primary, secondary = make_router()
+    primary.fail = secondary.fail = True
+    try:
+        router.invoke("hi")
+    except RuntimeError as e:
+        assert "unavailable" in str(e)
+    else:
+        raise AssertionError("expected the last provider error")
+
+def test_copy_shares_stats():
+    router, _, _ = make_router()
+    copy = router._copy(dict(router.models))
+    copy.invoke("hi")
+    assert router.stats["primary"].to_dict()["calls"] == 1
@@ -0,0 +1,51 @@
+import pytest
+from agent.refinement import is_refinement, journey_mentions
+
+OWNERSHIP_FILES = {
+    "backend/src/workflows/write/ownershipChange/ownershipChange.ts": "",
+    "backend/src/workflows/write/ownershipChange/actorSteps/enterNewOwner.ts": "",
+    "backend/src/workflows/write/ownershipChange/automatedSteps/submitOwnershipChange.ts": "",
+    "backend/src/activities/updateOwner.ts": "",
+    "frontend/src/components/OwnerForm.tsx": "",
+}
+
+@pytest.mark.parametrize("question, expected", [
+    # New journeys, whatever the leading verb
+    ("Add a beneficiary change journey", False),
+    ("Use the pattern of buildMygaDataCaptureStep to create the legal name change journey", False),
+    ("Create a journey for user signup", False),
+    ("Generate a new journey for refunds", False),
+    ("Build me an onboarding journey", False),
+    ("Make another workflow like this one for address changes", False),
+    ("Now write the beneficiary change journey", False),
+    ("How does the refund journey work?", False),
+    ("What are the most common steps in our claim journeys?", False),
+    # Questions that are not about the generated journey at all
+    ("What is an automated step?", False),
+    ("List the event types in the CSV", False),
+    # Edits of the session's journey
+    ("Rename enterNewOwner to captureNewOwner", True),
+    ("now add validation to the form", True),
+    ("Can you also remove the email step?", True),
+    ("Make the journey send an email", True),
+    ("Add a journey step that checks the policy status", True),
+    ("use zod instead", True),
+    ("Regenerate the ownership change journey with three steps", True),
+    ("Does this journey handle joint owners?", True),
+    ("What does OwnerForm render?", True),
+    ("Split the ownershipChange workflow into two actor steps", True),
+])
+def test_is_refinement(question, expected):
+    assert is_refinement(question, OWNERSHIP_FILES) is expected
+
+def test_nothing_to_refine_without_session_files():
+    assert is_refinement("Rename the step", {}) is False
+
+@pytest.mark.parametrize("question, mentions", [
+    ("create the legal name change journey", [("the", ["legal", "name", "change"])]),
+    ("Add a beneficiary change journey", [("a", ["beneficiary", "change"])]),
+    ("Add a journey step", []),
+    ("journey for refunds", [(None, [])]),
+])
+def test_journey_mentions(question, mentions):
+    assert journey_mentions(question) == mentions
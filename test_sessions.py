@@ -0,0 +1,55 @@
+import time
+from langchain_core.messages import AIMessage
+from langgraph.graph import END, START, StateGraph
+from langgraph.graph.message import add_messages
+from typing_extensions import Annotated, TypedDict
+from agent.sessions import create_checkpointer
+
+class State(TypedDict):
+    messages: Annotated[list, add_messages]
+
+def make_graph(checkpointer):
+    builder = StateGraph(State)
+    builder.add_node("reply", lambda state: {"messages": [AIMessage(content=f"reply {len(state['messages'])}")]})
+    builder.add_edge(START, "reply")
+    builder.add_edge("reply", END)
+    return builder.compile(checkpointer=checkpointer)
+
+def rows(checkpointer, thread_id):
+    return tuple(
+        checkpointer.conn.execute(f"SELECT COUNT(*) FROM {table} WHERE thread_id = ?", (thread_id,)).fetchone()[0]
+        for table in ("checkpoints", "writes")
+    )
+
+def test_end_turn_keeps_only_latest_checkpoint(tmp_path):
+    checkpointer = create_checkpointer(str(tmp_path / "sessions.sqlite"))
+    graph = make_graph(checkpointer)
+    config = {"configurable": {"thread_id": "s1"}}
+    for question in ("first", "second"):
+        graph.invoke({"messages": [question]}, config=config)
+        assert rows(checkpointer, "s1")[0] > 1
+        checkpointer.end_turn("s1")
+        assert rows(checkpointer, "s1") == (1, 0)
+    # The conversation still resumes from the pruned thread
+    assert [m.content for m in graph.get_state(config).values["messages"]] == ["first", "reply 1", "second", "reply 3"]
+
+def test_idle_threads_expire(tmp_path):
+    checkpointer = create_checkpointer(str(tmp_path / "sessions.sqlite"), idle_ttl_seconds=0.2, expire_interval_seconds=0)
+    graph = make_graph(checkpointer)
+    for thread_id in ("idle", "active"):
+        graph.invoke({"messages": ["hi"]}, config={"configurable": {"thread_id": thread_id}})
+        checkpointer.end_turn(thread_id)
+    time.sleep(0.3)
+    graph.invoke({"messages": ["again"]}, config={"configurable": {"thread_id": "active"}})
+    checkpointer.end_turn("active")
+    assert rows(checkpointer, "idle") == (0, 0)
+    assert rows(checkpointer, "active") == (1, 0)
+
+def test_delete_thread_removes_activity(tmp_path):
+    checkpointer = create_checkpointer(str(tmp_path / "sessions.sqlite"))
+    graph = make_graph(checkpointer)
+    graph.invoke({"messages": ["hi"]}, config={"configurable": {"thread_id": "s1"}})
+    checkpointer.end_turn("s1")
+    checkpointer.delete_thread("s1")
+    assert rows(checkpointer, "s1") == (0, 0)
+    assert checkpointer.conn.execute("SELECT COUNT(*) FROM session_activity").fetchone()[0] == 0
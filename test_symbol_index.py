@@ -0,0 +1,19 @@
+from langchain_core.documents import Document
+from utils.symbol_index import SymbolIndex
+
+CONFIG_TS = "export const steps = [];\nexport function buildMygaDataCaptureStep() {}\n"
+
+def make_index(tmp_path):
+    index = SymbolIndex(str(tmp_path / "symbols.json"))
+    index.index_source("config.ts", [Document(page_content=CONFIG_TS, metadata={"chunk_id": "config-0"})])
+    return index
+
+def test_plain_words_do_not_match_exports(tmp_path):
+    index = make_index(tmp_path)
+    assert index.find_symbols("Create an ownership change journey with three steps") == []
+    assert index.lookup("Create an ownership change journey with three steps") == ([], [])
+
+def test_identifiers_match_exports(tmp_path):
+    index = make_index(tmp_path)
+    assert index.find_symbols("Use buildMygaDataCaptureStep for the steps") == ["buildMygaDataCaptureStep"]
+    assert index.lookup("Use buildMygaDataCaptureStep") == (["buildMygaDataCaptureStep"], ["config-0"])
@@ -0,0 +1,190 @@
+import hashlib
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from utils.index_generation import get_index_generation
+from utils.semantic_cache import normalize_question
+from utils.ttl_cache import TTLCache
+
+POINTWISE_PROMPT = (
+    "Question: {question}\nDocument: {document}\n"
+    "How relevant is this document to the question? Reply with a score from 1 (not relevant) to 10 (highly relevant)."
+)
+
+LISTWISE_PROMPT = (
+    "Question: {question}\n\n"
+    "Below are {count} numbered passages.\n\n{passages}\n\n"
+    "Score how relevant each passage is to the question on a scale from 1 (not relevant) to 10 (highly relevant).\n"
+    "Reply with one line per passage in the format `<passage number>: <score>` and nothing else."
+)
+
+LISTWISE_LINE = re.compile(r"^\W*(\d+)\W*?[:=\-]\s*(\d+(?:\.\d+)?)", re.MULTILINE)
+NUMBER = re.compile(r"\d+(?:\.\d+)?")
+
+def _sha256(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+class RerankScoreCache:
+    """
+    Bounded TTL cache of rerank scores keyed by (normalized question hash, chunk content hash).
+
+    Entries are tagged with the index generation; when ingestion bumps the generation
+    the cache is dropped, so scores are never reused across index changes.
+    """
+    def __init__(self, max_entries=20000, ttl_seconds=3600):
+        self._cache = TTLCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+        self._generation = None
+
+    def _check_generation(self):
+        generation = get_index_generation()
+        if generation != self._generation:
+            self._cache.clear()
+            self._generation = generation
+
+    def keys(self, question, documents):
+        question_hash = _sha256(normalize_question(question))
+        return [(question_hash, _sha256(doc.page_content)) for doc in documents]
+
+    def get_many(self, keys):
+        """
+        Return {position in keys: cached score} for the keys that are cached.
+        """
+        self._check_generation()
+        scores = {}
+        for i, key in enumerate(keys):
+            score = self._cache.get(key)
+            if score is not None:
+                scores[i] = score
+        return scores
+
+    def set_many(self, items):
+        for key, score in items:
+            self._cache.set(key, score)
+
+    def clear(self):
+        self._cache.clear()
+
+    def stats(self):
+        return self._cache.stats()
+
+def _content_text(response):
+    content = getattr(response, "content", response)
+    if isinstance(content, list):
+        content = " ".join(str(item) for item in content)
+    return str(content)
+
+class LLMReranker:
+    """
+    Rerank retrieved documents with an LLM.
+
+    Modes:
+        pointwise: score every document with its own prompt, `max_concurrency` at a time.
+        listwise: score all documents in a single prompt and parse the scores back out.
+
+    Both modes stop waiting after `timeout` seconds. Documents without a score keep their
+    vector-score order behind the scored ones; if nothing was scored the input order is returned.
+    With a `score_cache`, only documents without a cached score for the question are sent to the LLM.
+    """
+    def __init__(self, llm, mode="listwise", max_concurrency=6, timeout=20, max_chars_per_document=1500, score_cache=None):
+        if mode not in ("pointwise", "listwise"):
+            raise ValueError(f"Unsupported rerank mode: {mode}")
+        self.llm = llm
+        self.mode = mode
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.max_chars_per_document = max_chars_per_document
+        self.score_cache = score_cache
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="rerank")
+
+    def rerank(self, question, documents):
+        """
+        Return the documents sorted by relevance (highest first).
+        """
+        if len(documents) < 2:
+            return list(documents)
+        start = time.perf_counter()
+        scores = {}
+        keys = None
+        if self.score_cache is not None:
+            keys = self.score_cache.keys(question, documents)
+            scores = self.score_cache.get_many(keys)
+
+        pending = [i for i in range(len(documents)) if i not in scores]
+        if pending:
+            pending_docs = [documents[i] for i in pending]
+            if self.mode == "listwise":
+                new_scores = self.score_listwise(question, pending_docs)
+            else:
+                new_scores = self.score_pointwise(question, pending_docs)
+            new_scores = {pending[i]: score for i, score in new_scores.items()}
+            if keys is not None:
+                self.score_cache.set_many((keys[i], score) for i, score in new_scores.items())
+            scores.update(new_scores)
+
+        print(
+            f"Reranked {len(documents)} documents ({self.mode}, {len(documents) - len(pending)} cached, "
+            f"{len(scores)} scored) in {time.perf_counter() - start:.2f}s"
+        )
+        return self.order(documents, scores)
+
+    @staticmethod
+    def order(documents, scores):
+        """
+        Sort documents by score, keeping the original (vector-score) order for ties and unscored documents.
+        """
+        if not scores:
+            return list(documents)
+        ranked = sorted(
+            range(len(documents)),
+            key=lambda i: (i not in scores, -scores.get(i, 0), i),
+        )
+        return [documents[i] for i in ranked]
+
+    def _score_one(self, question, document):
+        response = self.llm.invoke(POINTWISE_PROMPT.format(question=question, document=document.page_content))
+        match = NUMBER.search(_content_text(response))
+        if match is None:
+            raise ValueError("No score in rerank response")
+        return float(match.group())
+
+    def score_pointwise(self, question, documents):
+        """
+        Score each document with its own LLM call. Returns {document index: score}.
+        """
+        futures = {
+            self._executor.submit(self._score_one, question, doc): i
+            for i, doc in enumerate(documents)
+        }
+        done, not_done = wait(futures, timeout=self.timeout)
+        if not_done:
+            print(f"Rerank timed out, {len(not_done)} documents left unscored")
+        scores = {}
+        for future in done:
+            try:
+                scores[futures[future]] = future.result()
+            except Exception as e:
+                print(f"Rerank scoring failed: {e}")
+        return scores
+
+    def score_listwise(self, question, documents):
+        """
+        Score all documents with a single LLM call. Returns {document index: score}.
+        """
+        passages = "\n\n".join(
+            f"[{i + 1}]\n{doc.page_content[:self.max_chars_per_document]}"
+            for i, doc in enumerate(documents)
+        )
+        prompt = LISTWISE_PROMPT.format(question=question, count=len(documents), passages=passages)
+        future = self._executor.submit(self.llm.invoke, prompt)
+        try:
+            response = future.result(timeout=self.timeout)
+        except Exception as e:
+            print(f"Listwise rerank failed, keeping vector order: {e}")
+            return {}
+
+        scores = {}
+        for number, score in LISTWISE_LINE.findall(_content_text(response)):
+            index = int(number) - 1
+            if 0 <= index < len(documents) and index not in scores:
+                scores[index] = float(score)
+        return scores
@@ -1,69 +1,142 @@
 import os
+import threading
 from langchain.tools import tool
 from langchain_community.tools import TavilySearchResults
 from langchain_community.tools.polygon.financials import PolygonFinancials
 from data_models.models import RagToolSchema
-from langchain_pinecone import PineconeVectorStore
-from utils.chroma_db_store import ChromaDBVectorStore
+from utils.vector_stores import configured_vector_store_type, get_vector_store
 from utils.model_loaders import ModelLoader
 from utils.config_loader import load_config
+from utils.progress_events import emit_progress
+from utils.semantic_cache import SemanticCache, normalize_question
+from utils.lexical_index import extract_identifiers, get_lexical_index, lexical_index_path, reciprocal_rank_fusion
+from utils.symbol_index import get_symbol_index, symbol_index_path
+from langchain_core.documents import Document
+from langchain_core.messages import ToolMessage
+from langgraph.types import Command
+from utils.index_generation import get_index_generation
+from toolkit.reranker import LLMReranker, RerankScoreCache
 from dotenv import load_dotenv
-from pinecone import Pinecone
 model_loader=ModelLoader()
 config = load_config()
 load_dotenv()
+VECTOR_STORE_TYPE = configured_vector_store_type(config)
 
 # Use Google embeddings for now, but we'll use GROQ for the LLM
 
-def llm_rerank(question, documents, model_loader):
+def _retrieval_cache_settings(config):
+    retrieval_cache_config = config.get("retrieval_cache", {})
+    return {
+        "max_entries": retrieval_cache_config.get("max_entries", 512) if retrieval_cache_config.get("enabled", True) else 0,
+        "ttl_seconds": retrieval_cache_config.get("ttl_seconds", 3600),
+        "similarity_threshold": retrieval_cache_config.get("similarity_threshold", 0.95),
+    }
+
+retrieval_cache = SemanticCache(**_retrieval_cache_settings(config))
+
+_reranker = None
+_reranker_lock = threading.Lock()
+
+def reload_config(new_config):
+    """
+    Apply a changed config.yaml to retrieval: retriever and vector store settings, the reranker
+    (rebuilt on next use) and the retrieval cache, whose entries came from the old settings.
+    """
+    global config, VECTOR_STORE_TYPE, _reranker
+    config = new_config
+    model_loader.config = new_config
+    VECTOR_STORE_TYPE = configured_vector_store_type(new_config)
+    with _reranker_lock:
+        _reranker = None
+    retrieval_cache.configure(**_retrieval_cache_settings(new_config))
+
+def get_reranker():
+    """
+    Return the shared LLM reranker, loading its LLM on first use.
+    """
+    global _reranker
+    with _reranker_lock:
+        if _reranker is None:
+            rerank_config = config.get("reranker", {})
+            _reranker = LLMReranker(
+                llm=model_loader.load_llm(provider=rerank_config.get("provider", "google")),
+                mode=rerank_config.get("mode", "listwise"),
+                max_concurrency=rerank_config.get("max_concurrency", 6),
+                timeout=rerank_config.get("timeout_seconds", 20),
+                max_chars_per_document=rerank_config.get("max_chars_per_document", 1500),
+                score_cache=RerankScoreCache(
+                    max_entries=rerank_config.get("cache_max_entries", 20000),
+                    ttl_seconds=rerank_config.get("cache_ttl_seconds", 3600),
+                ) if rerank_config.get("cache_enabled", True) else None,
+            )
+        return _reranker
+
+def llm_rerank(question, documents):
     """
     Rerank documents using an LLM by scoring each document's relevance to the question.
     Returns a list of documents sorted by relevance (highest first).
     """
-    # Use the LLM to score each document
-    scored_docs = []
-    llm = model_loader.load_llm()
-    for doc in documents:
-        prompt = f"Question: {question}\nDocument: {doc.page_content}\nHow relevant is this document to the question? Reply with a score from 1 (not relevant) to 10 (highly relevant)."
-        try:
-            score_str = llm.invoke(prompt)
-            # Extract score (assume LLM returns a number or a string containing a number)
-            score = None
-            for token in str(score_str).split():
-                try:
-                    score = float(token)
-                    break
-                except ValueError:
-                    continue
-            if score is None:
-                score = 1  # fallback to lowest relevance
-        except Exception:
-            score = 1  # fallback on error
-        scored_docs.append((score, doc))
-    # Sort by score descending
-    scored_docs.sort(reverse=True, key=lambda x: x[0])
-    return [doc for score, doc in scored_docs]
+    return get_reranker().rerank(question, documents)
+
+def retrieval_key(question, vector_store_type=None):
+    """
+    Key for a retrieval result in graph state: the store, the index generation and the normalized question.
+    """
+    vector_store_type = vector_store_type or VECTOR_STORE_TYPE
+    return f"{vector_store_type}:{get_index_generation()}:{normalize_question(question)}"
 
 @tool(args_schema=RagToolSchema)
-def retriever_tool(question, vector_store_type="chroma"):
+def retriever_tool(question, state, tool_call_id, vector_store_type=None):
     """Retrieves information from the vector database based on the question.
     Useful for answering questions about data stored in the system, including CSV data with user IDs and event types."""
-    if vector_store_type == "pinecone":
-        pinecone_api_key = os.getenv("PINECONE_API_KEY")
-        pc = Pinecone(api_key=pinecone_api_key)
-
-        # Create vector store with the index
-        vector_store = PineconeVectorStore(
-            index=pc.Index(config["vector_db"]["index_name"]),
-            embedding=model_loader.load_embeddings()
-        )
-    elif vector_store_type == "chroma":
-        vector_store = ChromaDBVectorStore(embedding=model_loader.load_embeddings())
+    key = retrieval_key(question, vector_store_type)
+    documents = (state.get("retrievals") or {}).get(key)
+    update = {}
+    if documents is None:
+        documents = retrieve_documents(question, vector_store_type)
+        update["retrievals"] = {key: documents}
     else:
-        raise ValueError(f"Unsupported vector_store_type: {vector_store_type}")
+        print("Reusing retrieval from graph state")
+    content = "\n\n".join(doc.page_content for doc in documents)
+    update["messages"] = [ToolMessage(content=content, tool_call_id=tool_call_id)]
+    return Command(update=update)
+
+def retrieve_documents(question, vector_store_type=None):
+    """
+    Retrieve, fuse and rerank the documents for a question. Returns copies, so callers may modify them.
+    Without `vector_store_type`, uses the store configured under `vector_db.type`.
+    """
+    vector_store_type = vector_store_type or VECTOR_STORE_TYPE
+    embeddings = model_loader.load_embeddings()
+    cached_results, question_embedding = retrieval_cache.lookup(
+        question, namespace=vector_store_type, embed=lambda: embeddings.embed_query(question)
+    )
+    if cached_results is not None:
+        print("Retrieval cache hit")
+        emit_progress("retrieval_done", {"documents": len(cached_results), "cached": True})
+        return _with_question_note(question, cached_results)
+
+    vector_store = get_vector_store(vector_store_type, embeddings, config)
+
+    # Definitions of exported symbols the question names rank first in the fusion below
+    symbol_names, symbol_results = _lookup_symbols(question, vector_store_type)
+
+    hybrid_config = config["retriever"].get("hybrid", {})
+    lexical_index = None
+    known_identifiers = list(symbol_names)
+    if hybrid_config.get("enabled", True):
+        lexical_index = get_lexical_index(lexical_index_path(config, vector_store_type))
+        known_identifiers += [
+            name for name in extract_identifiers(question)
+            if name not in known_identifiers and lexical_index.has_term(name)
+        ]
 
-    # Increase k to get more results for better coverage
-    k = config["retriever"]["top_k"] * 6  # Increased multiplier for more results
+    if known_identifiers:
+        # Exact identifiers are found lexically, so a small k without LLM reranking is enough
+        k = hybrid_config.get("identifier_top_k", config["retriever"]["top_k"] * 2)
+    else:
+        # Increase k to get more results for better coverage
+        k = config["retriever"]["top_k"] * 6  # Increased multiplier for more results
 
     # Lower the threshold to capture more potentially relevant results
     threshold = max(0.01, config["retriever"]["score_threshold"] - 0.4)  # Lowered threshold further
@@ -80,16 +153,58 @@ def retriever_tool(question, vector_store_type="chroma"):
     # Get results
     retriever_result = retriever.invoke(question)
 
-    # LLM-based reranking
-    reranked_results = llm_rerank(question, retriever_result, model_loader)
+    if lexical_index is not None or symbol_results:
+        # Fuse symbol definitions, BM25 and vector rankings with reciprocal-rank fusion
+        lexical_results = (
+            [doc for doc, _ in lexical_index.search(question, k=hybrid_config.get("lexical_k", k))]
+            if lexical_index is not None else []
+        )
+        retriever_result = reciprocal_rank_fusion(
+            [symbol_results, lexical_results, retriever_result], k=hybrid_config.get("rrf_k", 60)
+        )[:max(k, len(symbol_results))]
+    emit_progress("retrieval_done", {"documents": len(retriever_result), "symbols": len(symbol_results)})
+
+    if known_identifiers:
+        print(f"Skipping LLM rerank, query names known identifiers: {known_identifiers}")
+        reranked_results = retriever_result
+    else:
+        # LLM-based reranking
+        reranked_results = llm_rerank(question, retriever_result)
+        emit_progress("rerank_done", {"documents": len(reranked_results)})
+
+    retrieval_cache.store(question, reranked_results, namespace=vector_store_type, embedding=question_embedding)
+    return _with_question_note(question, reranked_results)
+
+def _lookup_symbols(question, vector_store_type):
+    """
+    Fetch the definitions of TypeScript symbols named in the question, and of the symbols their
+    files import, by key from the symbol index. Returns (symbol names, definition documents),
+    both empty when the question names no known symbol.
+    """
+    symbol_config = config["retriever"].get("symbol_lookup", {})
+    if not symbol_config.get("enabled", True):
+        return [], []
+    symbol_index = get_symbol_index(symbol_index_path(config, vector_store_type))
+    names, chunk_ids = symbol_index.lookup(question, max_imports=symbol_config.get("max_imports", 8))
+    if not chunk_ids:
+        return [], []
+
+    lexical_index = get_lexical_index(lexical_index_path(config, vector_store_type))
+    documents = [doc for doc in (lexical_index.get(chunk_id) for chunk_id in chunk_ids) if doc is not None]
+    print(f"Symbol lookup for {names}: {len(chunk_ids)} definition chunks")
+    return names, documents
 
-    # If the question is about specific fields like userids or eventtypes, add a note
+def _with_question_note(question, documents):
+    """
+    Return a copy of the results, adding a note to the first document if the question is about
+    specific fields like userids or eventtypes. Copies keep cached results unmodified.
+    """
+    documents = [Document(page_content=doc.page_content, metadata=dict(doc.metadata)) for doc in documents]
     if any(keyword in question.lower() for keyword in ["userid", "user id", "eventtype", "event type"]):
         note = "\n\nNote: This data comes from the uploaded CSV file. If you need to extract specific user IDs or event types, please analyze the content carefully."
-        if reranked_results:
-            reranked_results[0].page_content += note
-
-    return reranked_results
+        if documents:
+            documents[0].page_content += note
+    return documents
 
 # tavilytool = TavilySearchResults(
 #     max_results=config["tools"]["tavily"]["max_results"],
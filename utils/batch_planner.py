@@ -0,0 +1,95 @@
+import json
+import time
+
+def estimate_payload_bytes(document, vector_bytes):
+    """
+    Rough size of one chunk in an upsert request: text, metadata and its embedding.
+    """
+    metadata = json.dumps(document.metadata, default=str)
+    return len(document.page_content.encode("utf-8")) + len(metadata.encode("utf-8")) + vector_bytes
+
+def plan_batches(documents, max_batch_bytes=2_000_000, max_batch_items=100, vector_bytes=384 * 12):
+    """
+    Pack documents, in order, into batches that stay under both the payload byte budget
+    and the embedding count limit. A document larger than the byte budget gets a batch of its own.
+    """
+    batches = []
+    batch = []
+    batch_bytes = 0
+    for doc in documents:
+        size = estimate_payload_bytes(doc, vector_bytes)
+        if batch and (batch_bytes + size > max_batch_bytes or len(batch) >= max_batch_items):
+            batches.append(batch)
+            batch = []
+            batch_bytes = 0
+        batch.append(doc)
+        batch_bytes += size
+    if batch:
+        batches.append(batch)
+    return batches
+
+# Chroma/SQLite's "message length too large" and the reason phrases of an HTTP 413
+SIZE_ERROR_MESSAGES = ("message length too large", "payload too large", "request entity too large")
+
+def _status_code(error):
+    for source in (error, getattr(error, "response", None)):
+        for attribute in ("status_code", "status"):
+            status = getattr(source, attribute, None)
+            if isinstance(status, int):
+                return status
+    return None
+
+def _is_size_error(error):
+    if _status_code(error) == 413:
+        return True
+    message = str(error).lower()
+    return any(marker in message for marker in SIZE_ERROR_MESSAGES)
+
+class BatchWriter:
+    """
+    Writes planned batches to a vector store with retries and exponential backoff.
+
+    Batches rejected as too large are split in half and retried; chunks that still fail
+    after `max_retries` attempts are recorded in `failed_ids` rather than dropped silently.
+    """
+    def __init__(self, vector_store, progress, max_retries=3, backoff_seconds=1.0):
+        self.vector_store = vector_store
+        self.progress = progress
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.written_ids = set()
+        self.failed_ids = []
+
+    def write(self, batches):
+        for number, batch in enumerate(batches, start=1):
+            print(f"Processing batch {number}/{len(batches)}: {len(batch)} documents")
+            self._write_batch(batch)
+        if self.failed_ids:
+            print(f"{len(self.failed_ids)} chunks failed to write")
+        return self.written_ids, self.failed_ids
+
+    def _write_batch(self, batch):
+        ids = [doc.metadata["chunk_id"] for doc in batch]
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                self.vector_store.add_documents(documents=batch, ids=ids)
+                self.written_ids.update(ids)
+                self.progress.incr("chunks_embedded", len(batch))
+                self.progress.incr("batches_upserted")
+                return
+            except Exception as e:
+                size_error = _is_size_error(e)
+                if size_error and len(batch) > 1:
+                    middle = len(batch) // 2
+                    print(f"Batch of {len(batch)} too large, splitting")
+                    self._write_batch(batch[:middle])
+                    self._write_batch(batch[middle:])
+                    return
+                if size_error or attempt == self.max_retries:
+                    self.progress.add_error(f"Failed to write {len(batch)} chunks after {attempt} attempts: {e}")
+                    self.progress.add_failed(ids)
+                    self.failed_ids.extend(ids)
+                    return
+                delay = self.backoff_seconds * 2 ** (attempt - 1)
+                print(f"Batch write failed ({e}), retrying in {delay:.1f}s")
+                time.sleep(delay)
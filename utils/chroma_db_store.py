@@ -3,21 +3,64 @@ from langchain_community.vectorstores import Chroma
 from langchain_core.documents import Document
 import os
 import tempfile
+import threading
+from utils.ingestion_manifest import content_hash
+from utils.persistence import DeferredPersist
 
-class ChromaDBVectorStore:
-    def __init__(self, embedding, persist_directory="chroma_db"):
+DEFAULT_COLLECTION = "langchain"
+
+class ChromaDBVectorStore(DeferredPersist):
+    """
+    Thread-safe wrapper around one Chroma collection.
+
+    Use `get_chroma_store` rather than constructing this directly, so every caller in the
+    process shares one client per persist directory and collection. Writers are serialized;
+    readers never take the write lock and keep serving while a write is in progress.
+    """
+    def __init__(self, embedding, persist_directory="chroma_db", collection_name=DEFAULT_COLLECTION):
         self.persist_directory = persist_directory
+        self.collection_name = collection_name
         self.embedding = embedding
         self.vector_store = Chroma(
+            collection_name=collection_name,
             embedding_function=self.embedding,
             persist_directory=self.persist_directory
         )
+        self._write_lock = threading.RLock()
+        self._init_deferred_persist(self._write_lock)
 
-    def add_documents(self, documents, ids=None):
-        # Chroma does not use explicit IDs in the same way as Pinecone
-        self.vector_store.add_documents(documents)
+    def _flush(self):
         self.vector_store.persist()
 
+    def _persist(self):
+        with self._write_lock:
+            if not self._defer_write():
+                self._flush()
+
+    def add_documents(self, documents, ids=None):
+        # With ids, Chroma upserts: re-adding an existing ID replaces it instead of duplicating it
+        with self._write_lock:
+            self.vector_store.add_documents(documents, ids=ids)
+            self._persist()
+
+    def delete(self, ids):
+        if ids:
+            with self._write_lock:
+                self.vector_store.delete(ids=ids)
+                self._persist()
+
+    def legacy_ids(self, source, content_hashes):
+        """
+        IDs of chunks of `source` written before content-addressed IDs (no chunk_id metadata)
+        whose text is one of `content_hashes`, i.e. duplicates of chunks being written again.
+        """
+        result = self.vector_store.get(where={"source": source}, include=["metadatas", "documents"])
+        return [
+            chunk_id
+            for chunk_id, metadata, text in zip(result["ids"], result["metadatas"], result["documents"])
+            if not (metadata or {}).get("chunk_id") and content_hash(text or "") in content_hashes
+        ]
+
     def as_retriever(self, search_type="mmr", lambda_mult=0.5, search_kwargs=None):
         if search_kwargs is None:
             search_kwargs = {}
@@ -28,3 +71,16 @@ class ChromaDBVectorStore:
             search_type=search_type,
             search_kwargs=search_kwargs
         )
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+def get_chroma_store(embedding, persist_directory="chroma_db", collection_name=DEFAULT_COLLECTION):
+    """
+    Return the process-wide ChromaDBVectorStore for a persist directory and collection.
+    """
+    key = (os.path.abspath(persist_directory), collection_name)
+    with _stores_lock:
+        if key not in _stores:
+            _stores[key] = ChromaDBVectorStore(embedding, persist_directory=persist_directory, collection_name=collection_name)
+        return _stores[key]
@@ -0,0 +1,106 @@
+def estimate_tokens(text, chars_per_token=4):
+    return (len(text) + chars_per_token - 1) // chars_per_token
+
+def _overlap(left, right, max_overlap):
+    """
+    Length of the longest suffix of `left` that is also a prefix of `right` (up to max_overlap chars).
+    """
+    for size in range(min(len(left), len(right), max_overlap), 0, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+class PackedContext:
+    """
+    Packed context text plus what went into it: chunk IDs included and dropped for the budget,
+    and the number of duplicate chunks removed.
+    """
+    def __init__(self, duplicates=0):
+        self.text = ""
+        self.tokens = 0
+        self.included = []
+        self.dropped = []
+        self.duplicates = duplicates
+
+    def to_dict(self):
+        return {
+            "tokens": self.tokens,
+            "included": len(self.included),
+            "dropped": self.dropped,
+            "duplicates": self.duplicates,
+        }
+
+class ContextPacker:
+    """
+    Assemble retrieved chunks into a prompt context under a token budget.
+
+    Documents are expected in relevance order (best first). Repeated chunks are dropped,
+    consecutive chunks of the same source (by `chunk_index`) are merged with the splitter
+    overlap removed, and the merged spans are added best-first until the budget is spent.
+    Spans that do not fit are reported in `dropped` by chunk ID.
+    """
+    def __init__(self, max_tokens=12000, chars_per_token=4, max_overlap_chars=400, separator="\n\n"):
+        self.max_tokens = max_tokens
+        self.chars_per_token = chars_per_token
+        self.max_overlap_chars = max_overlap_chars
+        self.separator = separator
+
+    @staticmethod
+    def _key(doc):
+        return doc.metadata.get("chunk_id") or doc.page_content
+
+    def _spans(self, documents):
+        """
+        Group deduplicated documents into runs of adjacent chunks. Returns [(rank, [(rank, doc)])].
+        """
+        seen = set()
+        by_source = {}
+        standalone = []
+        for rank, doc in enumerate(documents):
+            key = self._key(doc)
+            if key in seen:
+                continue
+            seen.add(key)
+            if doc.metadata.get("chunk_index") is None:
+                standalone.append((rank, [(rank, doc)]))
+            else:
+                by_source.setdefault(str(doc.metadata.get("source", "")), []).append((rank, doc))
+
+        spans = standalone
+        for chunks in by_source.values():
+            chunks.sort(key=lambda item: item[1].metadata["chunk_index"])
+            run = [chunks[0]]
+            for item in chunks[1:]:
+                if item[1].metadata["chunk_index"] == run[-1][1].metadata["chunk_index"] + 1:
+                    run.append(item)
+                else:
+                    spans.append((min(rank for rank, _ in run), run))
+                    run = [item]
+            spans.append((min(rank for rank, _ in run), run))
+        # A span ranks as high as its best chunk
+        return sorted(spans, key=lambda span: span[0]), len(documents) - len(seen)
+
+    def _merge(self, run):
+        text = run[0][1].page_content
+        for _, doc in run[1:]:
+            content = doc.page_content
+            text += content[_overlap(text, content, self.max_overlap_chars):]
+        return text
+
+    def pack(self, documents):
+        spans, duplicates = self._spans(documents)
+        parts = []
+        packed = PackedContext(duplicates=duplicates)
+        separator_tokens = estimate_tokens(self.separator, self.chars_per_token)
+        for _, run in spans:
+            text = self._merge(run)
+            tokens = estimate_tokens(text, self.chars_per_token) + (separator_tokens if parts else 0)
+            chunk_ids = [self._key(doc)[:32] for _, doc in run]
+            if packed.tokens + tokens > self.max_tokens:
+                packed.dropped.extend(chunk_ids)
+                continue
+            parts.append(text)
+            packed.tokens += tokens
+            packed.included.extend(chunk_ids)
+        packed.text = self.separator.join(parts)
+        return packed
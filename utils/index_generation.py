@@ -0,0 +1,35 @@
+import threading
+from utils.config_loader import load_config
+from utils.persistence import atomic_write_text
+
+# Ingestion bumps this counter whenever it changes the index, so caches keyed on it never serve stale results
+_lock = threading.Lock()
+_path = None
+
+def _generation_path():
+    global _path
+    if _path is None:
+        _path = load_config()["vector_db"].get("generation_path", "chroma_db/index_generation")
+    return _path
+
+def get_index_generation(path=None):
+    """
+    Return the current index generation (0 if the index was never written).
+    """
+    path = path or _generation_path()
+    try:
+        with open(path, "r") as file:
+            return int(file.read().strip() or 0)
+    except (OSError, ValueError):
+        return 0
+
+def bump_index_generation(path=None):
+    """
+    Increment and persist the index generation. Returns the new value.
+    """
+    path = path or _generation_path()
+    with _lock:
+        generation = get_index_generation(path) + 1
+        atomic_write_text(path, str(generation))
+    print(f"Index generation is now {generation}")
+    return generation
@@ -0,0 +1,109 @@
+import hashlib
+import json
+import threading
+from utils.persistence import atomic_write_json
+
+def content_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def assign_chunk_ids(chunks):
+    """
+    Give every chunk a content-addressed ID derived from its source, its position within
+    that source and its content hash. Stores chunk_id, chunk_index and content_hash in the
+    chunk metadata and returns the IDs in chunk order.
+    """
+    positions = {}
+    ids = []
+    for chunk in chunks:
+        source = str(chunk.metadata.get("source", ""))
+        index = positions.get(source, 0)
+        positions[source] = index + 1
+        digest = content_hash(chunk.page_content)
+        chunk_id = hashlib.sha256(f"{source}\x00{index}\x00{digest}".encode("utf-8")).hexdigest()[:32]
+        chunk.metadata["chunk_id"] = chunk_id
+        chunk.metadata["chunk_index"] = index
+        chunk.metadata["content_hash"] = digest
+        ids.append(chunk_id)
+    return ids
+
+class IngestionManifest:
+    """
+    Per-source record of the chunk IDs currently stored in a vector store.
+
+    Used to skip unchanged chunks when a file is uploaded again and, when the upload
+    explicitly replaces its sources, to delete chunks the new version no longer has.
+    Sources are upload filenames, which need not be unique (every folder has an index.ts),
+    so nothing is deleted unless replacing is requested.
+    """
+    def __init__(self, path, store="chroma"):
+        self.path = path
+        self.store = store
+        self._lock = threading.Lock()
+        self._data = self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, "r") as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    def _sources(self):
+        return self._data.setdefault(self.store, {})
+
+    def chunk_ids(self, source):
+        with self._lock:
+            return set(self._sources().get(source, []))
+
+    def diff(self, source, chunk_ids):
+        """
+        Compare the new chunk IDs of a source with the stored ones.
+        Returns (ids to write, stale ids to delete).
+        """
+        stored = self.chunk_ids(source)
+        new_ids = [chunk_id for chunk_id in chunk_ids if chunk_id not in stored]
+        stale_ids = sorted(stored - set(chunk_ids))
+        return new_ids, stale_ids
+
+    def plan(self, ids_by_source, replace=False):
+        """
+        Returns (ids to write, stale ids to delete) for an upload's {source: chunk ids}.
+        Stale ids are only reported for sources the upload replaces.
+        """
+        pending_ids = set()
+        stale_ids = []
+        for source, source_ids in ids_by_source.items():
+            new_ids, source_stale_ids = self.diff(source, source_ids)
+            pending_ids.update(new_ids)
+            if replace:
+                stale_ids.extend(source_stale_ids)
+        return pending_ids, stale_ids
+
+    def record(self, ids_by_source, written_ids, replace=False):
+        """
+        Record what is now stored per source. Chunks that failed to write are left out, so the
+        next upload retries them; without `replace`, the source's earlier chunks are kept.
+        """
+        for source, source_ids in ids_by_source.items():
+            stored = self.chunk_ids(source)
+            current = [chunk_id for chunk_id in source_ids if chunk_id in written_ids or chunk_id in stored]
+            self.update(source, current if replace else stored.union(current))
+
+    def sources(self):
+        with self._lock:
+            return set(self._sources())
+
+    def drop_store(self):
+        """
+        Forget every source recorded for this store (after the store itself was reset).
+        """
+        with self._lock:
+            self._data.pop(self.store, None)
+
+    def update(self, source, chunk_ids):
+        with self._lock:
+            self._sources()[source] = sorted(set(chunk_ids))
+
+    def save(self):
+        with self._lock:
+            atomic_write_json(self.path, self._data)
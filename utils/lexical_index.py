@@ -0,0 +1,153 @@
+import math
+import os
+import re
+from collections import Counter
+from langchain_core.documents import Document
+from utils.persistence import IndexRegistry, PersistedIndex
+
+WORD = re.compile(r"[A-Za-z0-9_$]+")
+# Splits camelCase / PascalCase / acronyms / digits: "QuickQuoteHexureDataBag" -> Quick Quote Hexure Data Bag
+SUBWORD = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+")
+IDENTIFIER = re.compile(r"\b(?:[a-z]+[A-Z]\w*|[A-Z][a-z0-9]+[A-Z]\w*|[A-Za-z]+_\w+)\b")
+
+def tokenize(text):
+    """
+    Code-aware tokenizer: every word is kept whole (lowercased) and also split into its
+    camelCase / PascalCase / snake_case parts, so both `buildMygaDataCaptureStep` and
+    "myga data capture" match the same chunk.
+    """
+    tokens = []
+    for word in WORD.findall(text):
+        lowered = word.lower()
+        tokens.append(lowered)
+        parts = [part.lower() for piece in word.split("_") for part in SUBWORD.findall(piece)]
+        if len(parts) > 1:
+            tokens.extend(parts)
+    return tokens
+
+def extract_identifiers(text):
+    """
+    Return the code identifiers (camelCase, PascalCase, snake_case) mentioned in a question.
+    """
+    return IDENTIFIER.findall(text)
+
+class LexicalIndex(PersistedIndex):
+    """
+    In-process BM25 inverted index over ingested chunks, persisted as JSON next to the vector store.
+
+    Chunks are keyed by their `chunk_id` metadata, so ingestion can upsert and delete them
+    incrementally alongside the vector store.
+    """
+    def __init__(self, path, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        super().__init__(path)
+
+    def _reset(self):
+        self.documents = {}
+        self.lengths = {}
+        self.postings = {}
+        self.total_length = 0
+
+    def _from_dict(self, data):
+        self.documents = data["documents"]
+        self.lengths = data["lengths"]
+        self.postings = data["postings"]
+        self.total_length = sum(self.lengths.values())
+
+    def _to_dict(self):
+        return {"documents": self.documents, "lengths": self.lengths, "postings": self.postings}
+
+    def _remove(self, chunk_id):
+        document = self.documents.pop(chunk_id, None)
+        if document is None:
+            return
+        for term in set(tokenize(document["text"])):
+            postings = self.postings.get(term)
+            if postings is not None:
+                postings.pop(chunk_id, None)
+                if not postings:
+                    del self.postings[term]
+        self.total_length -= self.lengths.pop(chunk_id, 0)
+
+    def add(self, documents):
+        """
+        Add or replace chunks (identified by metadata["chunk_id"]).
+        """
+        with self._lock:
+            for doc in documents:
+                chunk_id = doc.metadata["chunk_id"]
+                self._remove(chunk_id)
+                tokens = tokenize(doc.page_content)
+                self.documents[chunk_id] = {"text": doc.page_content, "metadata": dict(doc.metadata)}
+                self.lengths[chunk_id] = len(tokens)
+                self.total_length += len(tokens)
+                for term, count in Counter(tokens).items():
+                    self.postings.setdefault(term, {})[chunk_id] = count
+
+    def remove(self, chunk_ids):
+        with self._lock:
+            for chunk_id in chunk_ids:
+                self._remove(chunk_id)
+
+    def __contains__(self, chunk_id):
+        return chunk_id in self.documents
+
+    def get(self, chunk_id):
+        """
+        Fetch a stored chunk by ID, or None.
+        """
+        document = self.documents.get(chunk_id)
+        if document is None:
+            return None
+        return Document(page_content=document["text"], metadata=dict(document["metadata"]))
+
+    def has_term(self, term):
+        return term.lower() in self.postings
+
+    def search(self, query, k=10):
+        """
+        Return the top-k (Document, BM25 score) pairs for the query.
+        """
+        with self._lock:
+            count = len(self.documents)
+            if not count:
+                return []
+            average_length = self.total_length / count
+            scores = Counter()
+            for term in set(tokenize(query)):
+                postings = self.postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for chunk_id, frequency in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self.lengths[chunk_id] / average_length)
+                    scores[chunk_id] += idf * frequency * (self.k1 + 1) / (frequency + norm)
+            return [(self.get(chunk_id), score) for chunk_id, score in scores.most_common(k)]
+
+_indexes = IndexRegistry(LexicalIndex)
+
+def lexical_index_path(config, vector_store_type):
+    directory = config["vector_db"].get("lexical_index_dir", "chroma_db")
+    return os.path.join(directory, f"lexical_index_{vector_store_type}.json")
+
+def get_lexical_index(path):
+    """
+    Return the process-wide LexicalIndex for a path, so ingestion and retrieval share one instance.
+    """
+    return _indexes.get(path)
+
+def reciprocal_rank_fusion(result_lists, k=60, key=None):
+    """
+    Fuse ranked document lists with reciprocal-rank fusion: score = sum(1 / (k + rank)).
+    `key` maps a document to its identity (defaults to its chunk_id, falling back to its content).
+    """
+    key = key or (lambda doc: doc.metadata.get("chunk_id") or doc.page_content)
+    scores = Counter()
+    documents = {}
+    for results in result_lists:
+        for rank, doc in enumerate(results, start=1):
+            doc_key = key(doc)
+            scores[doc_key] += 1 / (k + rank)
+            documents.setdefault(doc_key, doc)
+    return [documents[doc_key] for doc_key, _ in scores.most_common()]
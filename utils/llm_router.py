@@ -0,0 +1,229 @@
+import contextvars
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Optional
+from langchain_core.runnables import Runnable, RunnableConfig
+from langchain_core.runnables.config import patch_config
+
+# Tag on hedged calls, so token streams can ignore the racing duplicate (see main.query_chatbot_stream)
+HEDGE_TAG = "llm_router:hedge"
+
+class ProviderStats:
+    """
+    Rolling latency and error statistics for one provider, plus its circuit breaker.
+
+    The breaker opens after `failure_threshold` consecutive failures and rejects calls for
+    `cooldown_seconds`; after that a single trial call is let through (half-open), which
+    closes the breaker on success or reopens it on failure.
+    """
+    def __init__(self, name, window=100, failure_threshold=3, cooldown_seconds=30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self.latencies = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def p95(self, min_samples=5):
+        with self._lock:
+            if len(self.latencies) < min_samples:
+                return None
+            ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+
+    def error_rate(self):
+        with self._lock:
+            return 1 - sum(self.outcomes) / len(self.outcomes) if self.outcomes else 0.0
+
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < self.cooldown_seconds:
+            return "open"
+        return "half_open"
+
+    def allow(self):
+        """
+        Whether a call may be sent now. Claims the trial slot when half-open.
+        """
+        with self._lock:
+            state = self.state()
+            if state == "closed":
+                return True
+            if state == "half_open" and not self.trial_in_flight:
+                self.trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self, latency):
+        with self._lock:
+            self.latencies.append(latency)
+            self.outcomes.append(1)
+            self.consecutive_failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.outcomes.append(0)
+            self.consecutive_failures += 1
+            if self.opened_at is not None or self.consecutive_failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    print(f"Circuit breaker opened for {self.name} after {self.consecutive_failures} failures")
+                self.opened_at = time.monotonic()
+            self.trial_in_flight = False
+
+    def to_dict(self):
+        p95 = self.p95()
+        return {
+            "state": self.state(),
+            "p95_seconds": round(p95, 3) if p95 is not None else None,
+            "error_rate": round(self.error_rate(), 3),
+            "calls": len(self.outcomes),
+            "consecutive_failures": self.consecutive_failures,
+        }
+
+class LLMRouter(Runnable):
+    """
+    Chat model wrapper that routes each call across providers in a fallback order.
+
+    The first provider whose circuit breaker is closed gets the request. If it has not answered
+    after its p95 latency (clamped to [hedge_min_delay, hedge_max_delay]; `initial_hedge_delay`
+    until enough samples exist), a hedged request goes to the next provider and the first
+    successful answer wins. Failures fall through to the next provider immediately.
+    Callbacks and context variables are carried into the worker threads, so tracing,
+    token streaming and progress events behave as if the model were called directly.
+    Hedged calls are tagged with HEDGE_TAG so their tokens can be kept out of a stream
+    that is already showing the primary's.
+    """
+    def __init__(
+        self,
+        models,
+        hedge=True,
+        initial_hedge_delay=8.0,
+        hedge_min_delay=1.0,
+        hedge_max_delay=20.0,
+        max_hedges=1,
+        stats=None,
+        window=100,
+        failure_threshold=3,
+        cooldown_seconds=30.0,
+        executor=None,
+    ):
+        if not models:
+            raise ValueError("LLMRouter needs at least one model")
+        # Insertion order is the fallback order
+        self.models = dict(models)
+        self.hedge = hedge
+        self.initial_hedge_delay = initial_hedge_delay
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_max_delay = hedge_max_delay
+        self.max_hedges = max_hedges
+        self.stats = stats or {
+            name: ProviderStats(name, window=window, failure_threshold=failure_threshold, cooldown_seconds=cooldown_seconds)
+            for name in self.models
+        }
+        self._executor = executor or ThreadPoolExecutor(max_workers=4 * len(self.models), thread_name_prefix="llm-router")
+
+    def _copy(self, models):
+        """
+        A router over different model objects (e.g. with tools bound) sharing this router's stats and threads.
+        """
+        return LLMRouter(
+            models,
+            hedge=self.hedge,
+            initial_hedge_delay=self.initial_hedge_delay,
+            hedge_min_delay=self.hedge_min_delay,
+            hedge_max_delay=self.hedge_max_delay,
+            max_hedges=self.max_hedges,
+            stats=self.stats,
+            executor=self._executor,
+        )
+
+    def bind_tools(self, tools, **kwargs):
+        return self._copy({name: model.bind_tools(tools, **kwargs) for name, model in self.models.items()})
+
+    def hedge_delay(self, name):
+        p95 = self.stats[name].p95()
+        if p95 is None:
+            return self.initial_hedge_delay
+        return min(self.hedge_max_delay, max(self.hedge_min_delay, p95))
+
+
+    def _call(self, name, input, config):
+        start = time.monotonic()
+        try:
+            result = self.models[name].invoke(input, config=config)
+        except Exception:
+            self.stats[name].record_failure()
+            raise
+        self.stats[name].record_success(time.monotonic() - start)
+        return result
+
+    def _submit(self, name, input, config):
+        # Each thread gets its own copy of the caller's context (run tree, custom event parent, ...)
+        context = contextvars.copy_context()
+        return self._executor.submit(context.run, self._call, name, input, config)
+
+    def _route(self, input, run_manager, config):
+        child_config = patch_config(config, callbacks=run_manager.get_child())
+        hedge_config = {**child_config, "tags": [*child_config.get("tags", []), HEDGE_TAG]}
+        candidates = list(self.models)
+        in_flight = {}
+        last_error = None
+        hedges = 0
+
+        def launch_next(hedge=False):
+            # Skip providers whose breaker is open; the breaker is only consulted (and a
+            # half-open trial claimed) for a provider that is actually called
+            while candidates:
+                name = candidates.pop(0)
+                if self.stats[name].allow():
+                    in_flight[self._submit(name, input, hedge_config if hedge else child_config)] = name
+                    return name
+            return None
+
+        primary = launch_next()
+        if primary is None:
+            # Every breaker open: trying anyway beats failing without a call
+            primary = next(iter(self.models))
+            in_flight[self._submit(primary, input, child_config)] = primary
+        timeout = self.hedge_delay(primary) if self.hedge else None
+        while in_flight:
+            done, _ = wait(in_flight, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                # Slow: hedge with the next provider and keep waiting on both
+                if hedges < self.max_hedges:
+                    slow = ", ".join(in_flight.values())
+                    hedge = launch_next(hedge=True)
+                    if hedge is not None:
+                        hedges += 1
+                        print(f"Hedging: {slow} slower than {timeout:.1f}s, also trying {hedge}")
+                timeout = None
+                continue
+            for future in done:
+                name = in_flight.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    print(f"LLM provider {name} failed: {e}")
+                    last_error = e
+                    continue
+                if name != primary:
+                    print(f"Answered by {name} instead of {primary}")
+                return result
+            # Everything in flight failed so far: fall back to the next provider
+            if not in_flight:
+                launch_next()
+        raise last_error
+
+    def invoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        return self._call_with_config(self._route, input, config)
+
+    def stats_dict(self):
+        return {name: stats.to_dict() for name, stats in self.stats.items()}
@@ -1,10 +1,32 @@
 import os
+import threading
 from dotenv import load_dotenv
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_groq import ChatGroq
 from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_openai import ChatOpenAI
 from utils.config_loader import load_config
+from utils.embedding_cache import CachedEmbeddings
+from utils.llm_router import LLMRouter
+from utils.rate_limiter import GuardedChatModel, get_rate_limiter, single_flight
+
+# One embedding model per process, shared by every ModelLoader instance
+_EMBEDDINGS = {}
+_EMBEDDINGS_LOCK = threading.Lock()
+# One router per process, so latency and breaker state cover every caller
+_ROUTER = None
+_ROUTER_LOCK = threading.Lock()
+
+def _embeddings_key(config):
+    # Everything the shared embedding model is built from
+    cache_config = config.get("embedding_cache", {})
+    return (
+        config["embedding_model"].get("provider", "huggingface"),
+        config["embedding_model"]["model_name"],
+        cache_config.get("enabled", True),
+        cache_config.get("path", "embedding_cache/embeddings.sqlite"),
+        cache_config.get("max_entries", 100000),
+    )
 
 class ModelLoader:
     """
@@ -27,11 +49,35 @@ class ModelLoader:
 
     def load_embeddings(self):
         """
-        Load and return the embedding model based on provider in config.
+        Return the shared embedding model based on provider in config.
+        The model is loaded once per process and wrapped in the on-disk embedding cache.
         """
-        print("Loading Embedding model")
         provider = self.config["embedding_model"].get("provider", "huggingface")
         model_name = self.config["embedding_model"]["model_name"]
+        key = _embeddings_key(self.config)
+        embeddings = _EMBEDDINGS.get(key)
+        if embeddings is not None:
+            return embeddings
+
+        with _EMBEDDINGS_LOCK:
+            if key not in _EMBEDDINGS:
+                embeddings = self._create_embeddings(provider, model_name)
+                cache_config = self.config.get("embedding_cache", {})
+                if cache_config.get("enabled", True) and hasattr(embeddings, "embed_documents"):
+                    embeddings = CachedEmbeddings(
+                        embeddings,
+                        model_name=model_name,
+                        path=cache_config.get("path", "embedding_cache/embeddings.sqlite"),
+                        max_entries=cache_config.get("max_entries", 100000),
+                    )
+                _EMBEDDINGS[key] = embeddings
+            return _EMBEDDINGS[key]
+
+    def _create_embeddings(self, provider, model_name):
+        """
+        Load the embedding model from the provider.
+        """
+        print("Loading Embedding model")
         if provider == "huggingface":
             hf_token = os.getenv("HF_TOKEN")
             return HuggingFaceEmbeddings(
@@ -53,11 +99,13 @@ class ModelLoader:
         Load and return the LLM model.
 
         Args:
-            provider (str): The provider to use. Options: "google", "groq", "openai"
+            provider (str): The provider to use. Options: "google", "groq", "openai", "router"
         """
         print(f"LLM loading using {provider} provider...")
 
-        if provider == "google":
+        if provider == "router":
+            return self.load_router()
+        elif provider == "google":
             model_name=self.config["llm"]["google"]["model_name"]
             # Configure the model with proper parameters
             model = ChatGoogleGenerativeAI(
@@ -86,4 +134,69 @@ class ModelLoader:
         else:
             raise ValueError(f"Unsupported provider: {provider}")
 
-        return model
\ No newline at end of file
+        return self._guard(provider, model)
+
+    def _guard(self, provider, model):
+        """
+        Wrap a provider model in the shared rate limiter and single-flight coalescing from `rate_limits`.
+        """
+        limits = self.config.get("rate_limits", {})
+        limiter = get_rate_limiter(provider, self.config)
+        coalesce = limits.get("single_flight", True)
+        if limiter is None and not coalesce:
+            return model
+        return GuardedChatModel(
+            model,
+            name=provider,
+            limiter=limiter,
+            single_flight=single_flight if coalesce else None,
+            chars_per_token=limits.get("chars_per_token", 4),
+            expected_output_tokens=limits.get("expected_output_tokens", 1000),
+        )
+
+    def load_router(self):
+        """
+        Return the shared LLMRouter over the providers in `llm_router.order`.
+        Providers that cannot be loaded (e.g. no API key) are left out of the rotation.
+        """
+        global _ROUTER
+        with _ROUTER_LOCK:
+            if _ROUTER is None:
+                router_config = self.config.get("llm_router", {})
+                models = {}
+                for provider in router_config.get("order", ["google", "groq", "openai"]):
+                    try:
+                        models[provider] = self.load_llm(provider=provider)
+                    except Exception as e:
+                        print(f"Skipping {provider} in LLM router: {e}")
+                _ROUTER = LLMRouter(
+                    models,
+                    hedge=router_config.get("hedge", True),
+                    initial_hedge_delay=router_config.get("initial_hedge_delay_seconds", 8.0),
+                    hedge_min_delay=router_config.get("hedge_min_delay_seconds", 1.0),
+                    hedge_max_delay=router_config.get("hedge_max_delay_seconds", 20.0),
+                    max_hedges=router_config.get("max_hedges", 1),
+                    window=router_config.get("latency_window", 100),
+                    failure_threshold=router_config.get("failure_threshold", 3),
+                    cooldown_seconds=router_config.get("cooldown_seconds", 30.0),
+                )
+            return _ROUTER
+
+def llm_router_stats():
+    """
+    Per-provider latency, error rate and breaker state of the shared router, or None if it is not in use.
+    """
+    return _ROUTER.stats_dict() if _ROUTER is not None else None
+
+def reset_shared_models(config):
+    """
+    Drop the shared router, and embedding models built from other settings than `config`,
+    so both are rebuilt from `config` on next use. An unchanged embedding model is kept loaded.
+    """
+    global _ROUTER
+    with _ROUTER_LOCK:
+        _ROUTER = None
+    key = _embeddings_key(config)
+    with _EMBEDDINGS_LOCK:
+        for stale_key in [existing for existing in _EMBEDDINGS if existing != key]:
+            del _EMBEDDINGS[stale_key]
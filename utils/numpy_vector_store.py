@@ -0,0 +1,367 @@
+import json
+import math
+import os
+import threading
+from typing import Any, Iterable, List, Optional, Tuple
+from uuid import uuid4
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+from langchain_core.vectorstores.utils import maximal_marginal_relevance
+from utils.persistence import DeferredPersist
+
+QUANTIZATION_MODES = ("none", "float16", "int8")
+SCORE_BLOCK_ROWS = 16384
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+class QuantizedMatrix:
+    """
+    In-memory compressed copy of the embedding matrix used for the first search pass.
+
+    float16 halves the size; int8 stores each dimension as a byte with a per-dimension
+    scale and offset (x ~= (code + 128) * scale + offset), a quarter of float32.
+    """
+    def __init__(self, matrix, mode):
+        self.mode = mode
+        self.scale = None
+        self.offset = None
+        if mode == "float16":
+            self.codes = np.empty(matrix.shape, dtype=np.float16)
+            for start in range(0, len(matrix), SCORE_BLOCK_ROWS):
+                self.codes[start:start + SCORE_BLOCK_ROWS] = matrix[start:start + SCORE_BLOCK_ROWS]
+        elif mode == "int8":
+            # Dimension ranges come from the data (normalized vectors use far less than [-1, 1])
+            low = np.full(matrix.shape[1], np.inf, dtype=np.float32)
+            high = np.full(matrix.shape[1], -np.inf, dtype=np.float32)
+            for start in range(0, len(matrix), SCORE_BLOCK_ROWS):
+                block = np.asarray(matrix[start:start + SCORE_BLOCK_ROWS], dtype=np.float32)
+                low = np.minimum(low, block.min(axis=0))
+                high = np.maximum(high, block.max(axis=0))
+            self.offset = low
+            self.scale = np.maximum(high - low, 1e-12) / 255.0
+            self.codes = np.empty(matrix.shape, dtype=np.int8)
+            for start in range(0, len(matrix), SCORE_BLOCK_ROWS):
+                block = np.asarray(matrix[start:start + SCORE_BLOCK_ROWS], dtype=np.float32)
+                self.codes[start:start + SCORE_BLOCK_ROWS] = np.clip(
+                    np.rint((block - self.offset) / self.scale) - 128, -128, 127
+                )
+        else:
+            raise ValueError(f"Unsupported quantization: {mode}")
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes
+
+    def scores(self, query_vector):
+        """
+        Approximate dot products of every row with the query.
+        """
+        if self.mode == "int8":
+            # (code + 128) * scale + offset, folded into the query: one product per row, two scalars per query
+            scaled_query = self.scale * query_vector
+            constant = 128.0 * float(scaled_query.sum()) + float(self.offset @ query_vector)
+        else:
+            scaled_query = query_vector
+            constant = 0.0
+        return np.concatenate([
+            np.asarray(self.codes[start:start + SCORE_BLOCK_ROWS], dtype=np.float32) @ scaled_query
+            for start in range(0, len(self.codes), SCORE_BLOCK_ROWS)
+        ]) + constant
+
+class NumpyVectorStore(DeferredPersist, VectorStore):
+    """
+    Exact (brute-force) vector store for small corpora.
+
+    Normalized float32 embeddings live in a memory-mapped .npy matrix with a JSON sidecar
+    holding ids, texts and metadata. A search is a single matrix-vector product over all rows,
+    with no client, SQLite or HNSW overhead. Writes rewrite both files atomically, so readers
+    in other processes pick up the new matrix on their next search. Use `get_numpy_store`
+    rather than constructing this directly, so the sidecar is parsed once per process.
+
+    With `quantization` set to "float16" or "int8", searches scan a compressed in-memory copy
+    instead and rescore the best `rescore_multiplier * k` candidates against the full-precision
+    rows, which are read from the memory map on demand.
+    """
+    def __init__(self, embedding: Embeddings, persist_directory="numpy_index", quantization="none", rescore_multiplier=4):
+        if quantization not in QUANTIZATION_MODES:
+            raise ValueError(f"Unsupported quantization: {quantization}")
+        self.embedding = embedding
+        self.persist_directory = persist_directory
+        self.quantization = quantization
+        self.rescore_multiplier = rescore_multiplier
+        self.matrix_path = os.path.join(persist_directory, "vectors.npy")
+        self.metadata_path = os.path.join(persist_directory, "metadata.json")
+        self._lock = threading.RLock()
+        self._init_deferred_persist(self._lock)
+        # Rows added while persisting is deferred, stacked onto the matrix when it is next needed
+        self._appended = []
+        self._mtime = None
+        self._matrix = None
+        self._quantized = None
+        self._ids = []
+        self._texts = []
+        self._metadatas = []
+        self._load()
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding
+
+    def __len__(self):
+        return len(self._ids)
+
+    def _load(self):
+        try:
+            mtime = os.path.getmtime(self.metadata_path)
+            with open(self.metadata_path, "r") as file:
+                sidecar = json.load(file)
+            matrix = np.load(self.matrix_path, mmap_mode="r")
+        except (OSError, ValueError):
+            return
+        self._matrix = matrix
+        self._quantized = None
+        self._ids = sidecar["ids"]
+        self._texts = sidecar["texts"]
+        self._metadatas = sidecar["metadatas"]
+        self._mtime = mtime
+
+    def _refresh(self):
+        if self._dirty:
+            # Unflushed writes are newer than anything on disk
+            return
+        try:
+            mtime = os.path.getmtime(self.metadata_path)
+        except OSError:
+            return
+        if mtime != self._mtime:
+            with self._lock:
+                self._load()
+
+    def _full_matrix(self):
+        if self._appended:
+            blocks = ([np.asarray(self._matrix, dtype=np.float32)] if self._matrix is not None and len(self._matrix) else []) + self._appended
+            self._matrix = np.vstack(blocks)
+            self._appended = []
+        if self._matrix is None:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.asarray(self._matrix, dtype=np.float32)
+
+    def _compressed(self):
+        """
+        The quantized copy of the current matrix, built on first search and again only after a write.
+        """
+        if self._quantized is None and self.quantization != "none" and len(self._ids):
+            self._quantized = QuantizedMatrix(self._full_matrix(), self.quantization)
+        return self._quantized
+
+    def _persist(self, matrix, ids, texts, metadatas):
+        """
+        Write the new contents now, or keep them in memory until the deferred block exits.
+        """
+        if not self._defer_write():
+            self._write(matrix, ids, texts, metadatas)
+            return
+        self._matrix = matrix
+        self._quantized = None
+        self._ids = ids
+        self._texts = texts
+        self._metadatas = metadatas
+
+    def _flush(self):
+        self._write(self._full_matrix(), self._ids, self._texts, self._metadatas)
+
+    def _write(self, matrix, ids, texts, metadatas):
+        os.makedirs(self.persist_directory, exist_ok=True)
+        tmp_matrix_path = f"{self.matrix_path}.tmp.npy"
+        np.save(tmp_matrix_path, np.asarray(matrix, dtype=np.float32))
+        tmp_metadata_path = f"{self.metadata_path}.tmp"
+        with open(tmp_metadata_path, "w") as file:
+            json.dump({"ids": ids, "texts": texts, "metadatas": metadatas}, file, default=str)
+        # Drop our mapping before replacing the file it points at
+        self._matrix = None
+        self._quantized = None
+        os.replace(tmp_matrix_path, self.matrix_path)
+        os.replace(tmp_metadata_path, self.metadata_path)
+        self._load()
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None, ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        """
+        Embed and upsert texts. Existing ids are replaced.
+        """
+        texts = list(texts)
+        metadatas = metadatas or [{} for _ in texts]
+        ids = list(ids) if ids else [str(uuid4()) for _ in texts]
+        vectors = _normalize(self.embedding.embed_documents(texts))
+        with self._lock:
+            self._refresh()
+            new_ids = set(ids)
+            keep = [i for i, chunk_id in enumerate(self._ids) if chunk_id not in new_ids]
+            if len(keep) == len(self._ids) and self._defer_write():
+                # Pure append while deferred: no copy of the existing rows per batch
+                self._appended.append(vectors)
+                self._quantized = None
+                self._ids = self._ids + ids
+                self._texts = self._texts + texts
+                self._metadatas = self._metadatas + [dict(metadata) for metadata in metadatas]
+                return ids
+            existing = self._full_matrix()
+            matrix = np.vstack([existing[keep], vectors]) if keep else vectors
+            self._persist(
+                matrix,
+                [self._ids[i] for i in keep] + ids,
+                [self._texts[i] for i in keep] + texts,
+                [self._metadatas[i] for i in keep] + [dict(metadata) for metadata in metadatas],
+            )
+        return ids
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        if not ids:
+            return False
+        with self._lock:
+            self._refresh()
+            remove = set(ids)
+            keep = [i for i, chunk_id in enumerate(self._ids) if chunk_id not in remove]
+            if len(keep) == len(self._ids):
+                return False
+            existing = self._full_matrix()
+            self._persist(
+                existing[keep] if keep else np.zeros((0, existing.shape[1]), dtype=np.float32),
+                [self._ids[i] for i in keep],
+                [self._texts[i] for i in keep],
+                [self._metadatas[i] for i in keep],
+            )
+        return True
+
+    def _document(self, position):
+        return Document(
+            id=self._ids[position],
+            page_content=self._texts[position],
+            metadata=dict(self._metadatas[position]),
+        )
+
+    @staticmethod
+    def _best(scores, k):
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        return top[np.argsort(-scores[top])]
+
+    def _top_k(self, query_vector, k, rescore=True):
+        """
+        Return [(row position, cosine similarity)] for the k most similar rows.
+        """
+        if not len(self._ids):
+            return []
+        quantized = self._compressed()
+        self._full_matrix()
+        query_vector = query_vector.reshape(-1)
+        if quantized is None:
+            scores = self._matrix @ query_vector
+            return [(int(i), float(scores[i])) for i in self._best(scores, k)]
+
+        approximate = quantized.scores(query_vector)
+        if not rescore:
+            return [(int(i), float(approximate[i])) for i in self._best(approximate, k)]
+        # Sorted positions keep the memory-mapped reads sequential
+        candidates = np.sort(self._best(approximate, k * self.rescore_multiplier))
+        exact = np.asarray(self._matrix[candidates], dtype=np.float32) @ query_vector
+        return [(int(candidates[i]), float(exact[i])) for i in self._best(exact, k)]
+
+    def recall_at_k(self, query_vectors, k=10):
+        """
+        Measure how well quantized search matches exact full-precision search.
+
+        Returns recall@k of the compressed scan alone and after full-precision rescoring,
+        plus the in-memory size of the compressed and full matrices.
+        """
+        self._refresh()
+        with self._lock:
+            if not len(self._ids):
+                return {}
+            self._full_matrix()
+            quantized = self._compressed()
+            report = {
+                "quantization": self.quantization,
+                "k": k,
+                "queries": len(query_vectors),
+                "full_bytes": int(self._matrix.nbytes),
+                "quantized_bytes": int(quantized.nbytes) if quantized is not None else int(self._matrix.nbytes),
+            }
+            if quantized is None:
+                report.update({"recall_at_k": 1.0, "recall_at_k_rescored": 1.0})
+                return report
+            hits = rescored_hits = 0
+            for query_vector in _normalize(query_vectors):
+                exact = set(self._best(self._matrix @ query_vector, k).tolist())
+                hits += len(exact & {i for i, _ in self._top_k(query_vector, k, rescore=False)})
+                rescored_hits += len(exact & {i for i, _ in self._top_k(query_vector, k)})
+            total = max(1, min(k, len(self._ids)) * len(query_vectors))
+            report.update({"recall_at_k": hits / total, "recall_at_k_rescored": rescored_hits / total})
+            return report
+
+    def similarity_search_with_score_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        self._refresh()
+        with self._lock:
+            query_vector = _normalize(embedding)
+            return [(self._document(i), score) for i, score in self._top_k(query_vector, k)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        """
+        Return (document, cosine similarity) pairs, most similar first.
+        """
+        return self.similarity_search_with_score_by_vector(self.embedding.embed_query(query), k=k, **kwargs)
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k=k, **kwargs)]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k=k, **kwargs)]
+
+    def _select_relevance_score_fn(self):
+        # Chroma's default relevance on normalized vectors: its L2 distance is squared (2 - 2cos),
+        # mapped to 1 - distance / sqrt(2). Same scale, so score thresholds carry over
+        return lambda cosine: 1.0 - (2.0 - 2.0 * cosine) / math.sqrt(2)
+
+    def max_marginal_relevance_search_by_vector(self, embedding: List[float], k: int = 4, fetch_k: int = 20, lambda_mult: float = 0.5, **kwargs: Any) -> List[Document]:
+        self._refresh()
+        with self._lock:
+            query_vector = _normalize(embedding)
+            candidates = self._top_k(query_vector, fetch_k)
+            if not candidates:
+                return []
+            candidate_vectors = np.asarray(self._matrix[[i for i, _ in candidates]], dtype=np.float32)
+            selected = maximal_marginal_relevance(query_vector, candidate_vectors, lambda_mult=lambda_mult, k=k)
+            return [self._document(candidates[i][0]) for i in selected]
+
+    def max_marginal_relevance_search(self, query: str, k: int = 4, fetch_k: int = 20, lambda_mult: float = 0.5, **kwargs: Any) -> List[Document]:
+        return self.max_marginal_relevance_search_by_vector(
+            self.embedding.embed_query(query), k=k, fetch_k=fetch_k, lambda_mult=lambda_mult, **kwargs
+        )
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[dict]] = None, ids: Optional[List[str]] = None, persist_directory="numpy_index", **kwargs: Any) -> "NumpyVectorStore":
+        store = cls(embedding=embedding, persist_directory=persist_directory, **kwargs)
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        return store
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+def get_numpy_store(embedding, persist_directory="numpy_index", quantization="none", rescore_multiplier=4):
+    """
+    Return the process-wide NumpyVectorStore for a persist directory and quantization mode.
+    """
+    key = (os.path.abspath(persist_directory), quantization)
+    with _stores_lock:
+        if key not in _stores:
+            _stores[key] = NumpyVectorStore(
+                embedding=embedding,
+                persist_directory=persist_directory,
+                quantization=quantization,
+                rescore_multiplier=rescore_multiplier,
+            )
+        return _stores[key]
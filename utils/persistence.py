@@ -0,0 +1,127 @@
+import json
+import os
+import threading
+from contextlib import contextmanager
+
+def atomic_write_text(path, text):
+    """
+    Write `text` to a temp file next to `path` and rename it over `path`, so readers
+    (in this or another process) only ever see the old or the new contents.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as file:
+        file.write(text)
+    os.replace(tmp_path, path)
+
+def atomic_write_json(path, data):
+    atomic_write_text(path, json.dumps(data, default=str))
+
+class PersistedIndex:
+    """
+    Base for in-process indexes persisted as one JSON file.
+
+    Subclasses implement `_reset()`, `_from_dict(data)` and `_to_dict()`. `refresh()` reloads
+    the file when another process rewrote it; `save()` writes it atomically.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._reset()
+        self._load()
+
+    def _reset(self):
+        pass
+
+    def _from_dict(self, data):
+        raise NotImplementedError
+
+    def _to_dict(self):
+        raise NotImplementedError
+
+    def _load(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+            with open(self.path, "r") as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return
+        self._reset()
+        self._from_dict(data)
+        self._mtime = mtime
+
+    def refresh(self):
+        """
+        Reload the index if another process rewrote it.
+        """
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        if mtime != self._mtime:
+            with self._lock:
+                self._load()
+
+    def save(self):
+        with self._lock:
+            atomic_write_json(self.path, self._to_dict())
+            self._mtime = os.path.getmtime(self.path)
+
+class IndexRegistry:
+    """
+    Process-wide instances of a PersistedIndex class by path, so ingestion and retrieval share one.
+    """
+    def __init__(self, index_class):
+        self.index_class = index_class
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def get(self, path):
+        with self._lock:
+            if path not in self._indexes:
+                self._indexes[path] = self.index_class(path)
+            index = self._indexes[path]
+        index.refresh()
+        return index
+
+class DeferredPersist:
+    """
+    Mixin grouping a store's writes into one persist.
+
+    Call `_init_deferred_persist(lock)` from `__init__`; writes call `_defer_write()`, which returns
+    True (and remembers the write) inside a `deferred_persist()` block, and implement `_flush()`,
+    which runs when the outermost block exits after deferred writes.
+    """
+    def _init_deferred_persist(self, lock):
+        self._persist_lock = lock
+        self._defer_depth = 0
+        self._dirty = False
+
+    def _flush(self):
+        raise NotImplementedError
+
+    def _defer_write(self):
+        with self._persist_lock:
+            if not self._defer_depth:
+                return False
+            self._dirty = True
+            return True
+
+    @contextmanager
+    def deferred_persist(self):
+        """
+        Group writes: persist once when the outermost block exits instead of after every write.
+        """
+        with self._persist_lock:
+            self._defer_depth += 1
+        try:
+            yield self
+        finally:
+            with self._persist_lock:
+                self._defer_depth -= 1
+                if not self._defer_depth and self._dirty:
+                    self._dirty = False
+                    self._flush()
@@ -0,0 +1,12 @@
+from langchain_core.callbacks.manager import dispatch_custom_event
+
+def emit_progress(name, data=None):
+    """
+    Emit a custom progress event (e.g. "retrieval_done") to graph event streams.
+
+    Does nothing when called outside a running graph, so tools stay usable on their own.
+    """
+    try:
+        dispatch_custom_event(name, data or {})
+    except RuntimeError:
+        pass
@@ -0,0 +1,195 @@
+import hashlib
+import json
+import threading
+import time
+from typing import Any, Optional
+from langchain_core.runnables import Runnable, RunnableConfig
+from langchain_core.runnables.config import patch_config
+
+class RateLimitExceeded(RuntimeError):
+    pass
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled continuously at `rate` units per second up to `capacity`.
+    `consume` may push the level below zero (debt), which later `acquire` calls wait out.
+    """
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.level = capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, amount=1, timeout=None):
+        """
+        Take `amount` units, waiting for the refill if needed. Raises RateLimitExceeded after `timeout` seconds.
+        """
+        # A request bigger than the bucket could never fit; let it through once the bucket is full
+        amount = min(amount, self.capacity)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                self._refill()
+                if self.level >= amount:
+                    self.level -= amount
+                    return
+                wait_seconds = (amount - self.level) / self.rate
+            if deadline is not None and time.monotonic() + wait_seconds > deadline:
+                raise RateLimitExceeded(f"Rate limit: no capacity for {amount} units within {timeout}s")
+            time.sleep(min(wait_seconds, 1.0))
+
+    def consume(self, amount):
+        with self._lock:
+            self._refill()
+            self.level -= amount
+
+class ProviderRateLimiter:
+    """
+    Request and token budgets for one provider, as two token buckets (per minute).
+    """
+    def __init__(self, requests_per_minute=60, tokens_per_minute=100000, max_wait_seconds=30.0):
+        self.requests = TokenBucket(requests_per_minute / 60.0, requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute / 60.0, tokens_per_minute)
+        self.max_wait_seconds = max_wait_seconds
+
+    def acquire(self, estimated_tokens):
+        self.requests.acquire(1, timeout=self.max_wait_seconds)
+        self.tokens.acquire(estimated_tokens, timeout=self.max_wait_seconds)
+
+    def settle(self, estimated_tokens, actual_tokens):
+        """
+        Charge (or refund) the difference between the estimate and the tokens actually used.
+        """
+        if actual_tokens is not None:
+            self.tokens.consume(actual_tokens - estimated_tokens)
+
+class SingleFlight:
+    """
+    Coalesce concurrent identical calls: the first caller for a key runs the function, and
+    callers arriving while it is in flight wait for and share its result (or exception).
+    """
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0
+
+    def do(self, key, fn):
+        """
+        Returns (result, shared) where shared is True if another caller's result was reused.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = {"done": threading.Event(), "result": None, "error": None}
+                self._calls[key] = call
+            else:
+                self.coalesced += 1
+        if not leader:
+            call["done"].wait()
+            if call["error"] is not None:
+                raise call["error"]
+            return call["result"], True
+        try:
+            call["result"] = fn()
+            return call["result"], False
+        except Exception as e:
+            call["error"] = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call["done"].set()
+
+def _input_text(input):
+    if isinstance(input, str):
+        return input
+    messages = input.to_messages() if hasattr(input, "to_messages") else input
+    return json.dumps([
+        [getattr(message, "type", ""), getattr(message, "content", message),
+         getattr(message, "tool_calls", None), getattr(message, "tool_call_id", None)]
+        for message in messages
+    ], default=str)
+
+class GuardedChatModel(Runnable):
+    """
+    Chat model wrapper that applies a provider's rate limits and coalesces identical concurrent calls.
+
+    The token budget is charged an estimate (prompt characters / `chars_per_token` plus
+    `expected_output_tokens`) before the call and corrected from the response's usage metadata.
+    Identical prompts to the same model in flight at the same time share one call.
+    """
+    def __init__(self, model, name, limiter=None, single_flight=None, chars_per_token=4, expected_output_tokens=1000):
+        self.model = model
+        self.name = name
+        self.limiter = limiter
+        self.single_flight = single_flight
+        self.chars_per_token = chars_per_token
+        self.expected_output_tokens = expected_output_tokens
+
+    def bind_tools(self, tools, **kwargs):
+        bound = self.model.bind_tools(tools, **kwargs)
+        tool_names = ",".join(sorted(getattr(tool, "name", str(tool)) for tool in tools))
+        return GuardedChatModel(
+            bound, f"{self.name}+tools:{tool_names}", self.limiter, self.single_flight,
+            self.chars_per_token, self.expected_output_tokens,
+        )
+
+    def _call_model(self, input, config, prompt_text):
+        if self.limiter is None:
+            return self.model.invoke(input, config=config)
+        estimated_tokens = len(prompt_text) // self.chars_per_token + self.expected_output_tokens
+        self.limiter.acquire(estimated_tokens)
+        result = self.model.invoke(input, config=config)
+        usage = getattr(result, "usage_metadata", None) or {}
+        self.limiter.settle(estimated_tokens, usage.get("total_tokens"))
+        return result
+
+    def _guarded(self, input, run_manager, config):
+        child_config = patch_config(config, callbacks=run_manager.get_child())
+        prompt_text = _input_text(input)
+        if self.single_flight is None:
+            return self._call_model(input, child_config, prompt_text)
+        key = hashlib.sha256(f"{self.name}\x00{prompt_text}".encode("utf-8")).hexdigest()
+        result, shared = self.single_flight.do(key, lambda: self._call_model(input, child_config, prompt_text))
+        if shared:
+            print(f"Coalesced identical {self.name} call")
+            return result.model_copy(deep=True) if hasattr(result, "model_copy") else result
+        return result
+
+    def invoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        return self._call_with_config(self._guarded, input, config)
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+single_flight = SingleFlight()
+
+def get_rate_limiter(provider, config):
+    """
+    Return the process-wide limiter for a provider from the `rate_limits` config, or None if not limited.
+    """
+    limits = config.get("rate_limits", {})
+    provider_limits = limits.get(provider)
+    if not limits.get("enabled", True) or not provider_limits:
+        return None
+    with _limiters_lock:
+        if provider not in _limiters:
+            _limiters[provider] = ProviderRateLimiter(
+                requests_per_minute=provider_limits.get("requests_per_minute", 60),
+                tokens_per_minute=provider_limits.get("tokens_per_minute", 100000),
+                max_wait_seconds=limits.get("max_wait_seconds", 30.0),
+            )
+        return _limiters[provider]
+
+def reset_rate_limiters():
+    """
+    Drop the process-wide limiters so the next get_rate_limiter call builds them from the current config.
+    """
+    with _limiters_lock:
+        _limiters.clear()
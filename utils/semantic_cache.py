@@ -0,0 +1,94 @@
+import threading
+import numpy as np
+from utils.index_generation import get_index_generation
+from utils.ttl_cache import TTLCache
+
+def normalize_question(question):
+    """
+    Lowercase, collapse whitespace and strip trailing punctuation so trivially rephrased questions match.
+    """
+    return " ".join(str(question).lower().split()).rstrip("?.! ")
+
+class SemanticCache:
+    """
+    Two-level cache for question-keyed results, versioned by the index generation.
+
+    Level 1 is an exact match on the normalized question. Level 2 is a near-duplicate match:
+    the cached question whose embedding has the highest cosine similarity to the new one,
+    if it is at least `similarity_threshold`. Entries from an older index generation are
+    never returned.
+    """
+    def __init__(self, max_entries=512, ttl_seconds=3600, similarity_threshold=0.95):
+        self.similarity_threshold = similarity_threshold
+        self._entries = TTLCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+        self._generation = None
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    def _current_generation(self):
+        generation = get_index_generation()
+        with self._lock:
+            if generation != self._generation:
+                self._entries.clear()
+                self._generation = generation
+        return generation
+
+    def lookup(self, question, namespace="", embed=None):
+        """
+        Return (value, embedding). `value` is None on a miss. `embed` is a callable returning the
+        question embedding; it is only called when the exact match misses, and the embedding is
+        returned so the caller can reuse it for `store`.
+        """
+        generation = self._current_generation()
+        key = (namespace, generation, normalize_question(question))
+        entry = self._entries.get(key)
+        if entry is not None:
+            self.exact_hits += 1
+            return entry[1], entry[0]
+
+        embedding = None
+        if embed is not None:
+            embedding = np.asarray(embed(), dtype=np.float32)
+            best_value, best_score = None, self.similarity_threshold
+            for (entry_namespace, entry_generation, _), (entry_embedding, value) in self._entries.items():
+                if entry_namespace != namespace or entry_generation != generation or entry_embedding is None:
+                    continue
+                score = float(np.dot(embedding, entry_embedding) / (
+                    np.linalg.norm(embedding) * np.linalg.norm(entry_embedding) + 1e-12
+                ))
+                if score >= best_score:
+                    best_value, best_score = value, score
+            if best_value is not None:
+                self.semantic_hits += 1
+                return best_value, embedding
+
+        self.misses += 1
+        return None, embedding
+
+    def store(self, question, value, namespace="", embedding=None):
+        generation = self._current_generation()
+        if embedding is not None:
+            embedding = np.asarray(embedding, dtype=np.float32)
+        self._entries.set((namespace, generation, normalize_question(question)), (embedding, value))
+
+    def clear(self):
+        self._entries.clear()
+
+    def configure(self, max_entries=512, ttl_seconds=3600, similarity_threshold=0.95):
+        """
+        Apply new settings in place (callers keep their reference) and drop the cached entries.
+        """
+        self.similarity_threshold = similarity_threshold
+        self._entries.max_entries = max_entries
+        self._entries.ttl_seconds = ttl_seconds
+        self._entries.clear()
+
+    def stats(self):
+        return {
+            "entries": len(self._entries),
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+        }
@@ -0,0 +1,127 @@
+import os
+import re
+from utils.lexical_index import extract_identifiers
+from utils.persistence import IndexRegistry, PersistedIndex
+
+TS_EXTENSIONS = (".ts", ".tsx")
+
+EXPORT = re.compile(
+    r"^\s*export\s+(?:default\s+)?(?:declare\s+)?(?:abstract\s+)?(?:async\s+)?"
+    r"(function\*?|class|interface|type|const|let|var|enum)\s+([A-Za-z_$][\w$]*)",
+    re.MULTILINE,
+)
+IMPORT = re.compile(r"import\s+(?:type\s+)?([\w$\s{},*]+?)\s+from\s+['\"]([^'\"]+)['\"]")
+# Captures the exported name of "{ a as b }" (a), since that is what the symbol index is keyed on
+IMPORT_NAME = re.compile(r"([A-Za-z_$][\w$]*)(?:\s+as\s+[\w$]+)?")
+
+def extract_exports(text):
+    """
+    Return [(name, kind)] for exported functions, classes, interfaces, types, consts and enums.
+    """
+    return [(name, kind.rstrip("*")) for kind, name in EXPORT.findall(text)]
+
+def extract_imports(text):
+    """
+    Return [(imported name, module)] for the import statements in a TypeScript chunk.
+    """
+    imports = []
+    for names, module in IMPORT.findall(text):
+        for name in IMPORT_NAME.findall(names.replace("{", " ").replace("}", " ").replace("*", " ")):
+            if name not in ("as", "type"):
+                imports.append((name, module))
+    return imports
+
+class SymbolIndex(PersistedIndex):
+    """
+    Index of exported TypeScript symbols -> defining chunk, plus the imports of each source file.
+
+    Lets retrieval fetch the definition of a symbol named in a question (and the definitions of the
+    symbols its file imports) by key, without embedding the question or running a vector search.
+    """
+    def _reset(self):
+        self.symbols = {}
+        self.imports = {}
+
+    def _from_dict(self, data):
+        self.symbols = data["symbols"]
+        self.imports = data["imports"]
+
+    def _to_dict(self):
+        return {"symbols": self.symbols, "imports": self.imports}
+
+    def index_source(self, source, chunks, replace=True):
+        """
+        Index the definitions and imports found in a source's chunks. With `replace`, everything
+        indexed earlier for `source` is dropped first; otherwise the chunks are added to it.
+        """
+        with self._lock:
+            if replace:
+                self._remove_source(source)
+            if not source.lower().endswith(TS_EXTENSIONS):
+                return
+            imports = {}
+            for chunk in chunks:
+                for name, kind in extract_exports(chunk.page_content):
+                    definitions = self.symbols.setdefault(name, [])
+                    if not any(entry["chunk_id"] == chunk.metadata["chunk_id"] for entry in definitions):
+                        definitions.append({"chunk_id": chunk.metadata["chunk_id"], "source": source, "kind": kind})
+                for name, module in extract_imports(chunk.page_content):
+                    imports[name] = module
+            if imports:
+                self.imports[source] = {**self.imports.get(source, {}), **imports}
+
+    def remove_source(self, source):
+        with self._lock:
+            self._remove_source(source)
+
+    def _remove_source(self, source):
+        self.imports.pop(source, None)
+        for name in list(self.symbols):
+            definitions = [entry for entry in self.symbols[name] if entry["source"] != source]
+            if definitions:
+                self.symbols[name] = definitions
+            else:
+                del self.symbols[name]
+
+    def find_symbols(self, text):
+        """
+        Return the known symbol names mentioned in `text` (exact, case-sensitive), in order of mention.
+        Only identifier-shaped words (camelCase, PascalCase, snake_case) count, so ordinary words
+        such as "steps" don't match an `export const steps`.
+        """
+        found = []
+        for word in extract_identifiers(text):
+            if word in self.symbols and word not in found:
+                found.append(word)
+        return found
+
+    def lookup(self, text, max_imports=8):
+        """
+        Return the chunk IDs for the definitions of the symbols mentioned in `text`, followed by the
+        definitions of the symbols their files directly import (at most `max_imports`).
+        """
+        with self._lock:
+            names = self.find_symbols(text)
+            chunk_ids = []
+            import_ids = []
+            for name in names:
+                for entry in self.symbols[name]:
+                    if entry["chunk_id"] not in chunk_ids:
+                        chunk_ids.append(entry["chunk_id"])
+                    for imported in self.imports.get(entry["source"], {}):
+                        for definition in self.symbols.get(imported, []):
+                            if definition["chunk_id"] not in chunk_ids and definition["chunk_id"] not in import_ids:
+                                import_ids.append(definition["chunk_id"])
+            return names, chunk_ids + [chunk_id for chunk_id in import_ids if chunk_id not in chunk_ids][:max_imports]
+
+_indexes = IndexRegistry(SymbolIndex)
+
+def symbol_index_path(config, vector_store_type):
+    directory = config["vector_db"].get("lexical_index_dir", "chroma_db")
+    return os.path.join(directory, f"symbol_index_{vector_store_type}.json")
+
+def get_symbol_index(path):
+    """
+    Return the process-wide SymbolIndex for a path, so ingestion and retrieval share one instance.
+    """
+    return _indexes.get(path)
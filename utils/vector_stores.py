@@ -0,0 +1,70 @@
+import os
+from contextlib import nullcontext
+from langchain_pinecone import PineconeVectorStore
+from pinecone import ServerlessSpec, Pinecone
+from utils.chroma_db_store import get_chroma_store
+from utils.numpy_vector_store import get_numpy_store
+
+VECTOR_STORE_TYPES = ("chroma", "pinecone", "numpy")
+
+def configured_vector_store_type(config):
+    """
+    The store ingestion and retrieval use, from `vector_db.type` (default "chroma").
+    """
+    vector_store_type = config["vector_db"].get("type", "chroma")
+    if vector_store_type not in VECTOR_STORE_TYPES:
+        raise ValueError(f"Unsupported vector_db.type: {vector_store_type}")
+    return vector_store_type
+
+def get_vector_store(vector_store_type, embedding, config, create_index=False):
+    """
+    Return the vector store for `vector_store_type` ("chroma", "pinecone" or "numpy").
+
+    Args:
+        create_index (bool): Create the Pinecone index if it does not exist yet (ingestion only).
+    """
+    if vector_store_type == "pinecone":
+        pinecone_client = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
+        index_name = config["vector_db"]["index_name"]
+
+        if create_index and index_name not in [i.name for i in pinecone_client.list_indexes()]:
+            pinecone_client.create_index(
+                name=index_name,
+                dimension=384,  # adjust if needed based on embedding model
+                metric="cosine",
+                spec=ServerlessSpec(cloud="aws", region="us-east-1"),
+            )
+
+        return PineconeVectorStore(index=pinecone_client.Index(index_name), embedding=embedding)
+    elif vector_store_type == "chroma":
+        chroma_config = config["vector_db"].get("chroma", {})
+        return get_chroma_store(
+            embedding,
+            persist_directory=chroma_config.get("persist_directory", "chroma_db"),
+            collection_name=chroma_config.get("collection_name", "langchain"),
+        )
+    elif vector_store_type == "numpy":
+        numpy_config = config["vector_db"].get("numpy", {})
+        return get_numpy_store(
+            embedding,
+            persist_directory=numpy_config.get("persist_directory", "numpy_index"),
+            quantization=numpy_config.get("quantization", "none"),
+            rescore_multiplier=numpy_config.get("rescore_multiplier", 4),
+        )
+    else:
+        raise ValueError(f"Unsupported vector_store_type: {vector_store_type}")
+
+def write_session(vector_store):
+    """
+    Context manager grouping a job's writes into one persist, for stores that support it.
+    """
+    deferred_persist = getattr(vector_store, "deferred_persist", None)
+    return deferred_persist() if deferred_persist else nullcontext()
+
+def legacy_chunk_ids(vector_store, source, content_hashes):
+    """
+    Chunks of `source` stored before content-addressed IDs that duplicate `content_hashes`,
+    for stores that can list chunks by source (empty otherwise).
+    """
+    legacy_ids = getattr(vector_store, "legacy_ids", None)
+    return legacy_ids(source, content_hashes) if legacy_ids else []